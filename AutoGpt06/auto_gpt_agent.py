@@ -2,6 +2,8 @@ import os
 import sys
 import json
 import re
+import ast
+import functools
 from typing import List
 
 sys.stdout.reconfigure(encoding="utf-8")
@@ -274,6 +276,27 @@ def retrieve_from_memory(query: str) -> str:
     )
 
 
+# calculate 的安全求值沿用 LangChain03/demo07_react_agent.py 的做法（白名单的取舍见那里），
+# 本目录不依赖 LangChain03 的代码，所以保留一份副本，两边的白名单要保持一致。
+_CALC_ALLOWED_NODES = (
+    ast.Expression, ast.BinOp, ast.UnaryOp, ast.Constant,
+    ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod,
+    ast.UAdd, ast.USub,
+)
+
+
+@functools.lru_cache(maxsize=512)
+def _compile_expression(expression: str):
+    """白名单检查后编译成字节码，按表达式字符串缓存"""
+    tree = ast.parse(expression.strip(), mode="eval")
+    for node in ast.walk(tree):
+        if not isinstance(node, _CALC_ALLOWED_NODES):
+            raise ValueError(f"不支持的语法：{type(node).__name__}，只支持基本数学运算")
+        if isinstance(node, ast.Constant) and not isinstance(node.value, (int, float)):
+            raise ValueError("表达式里只能出现数字")
+    return compile(tree, "<calculate>", "eval")
+
+
 @tool
 def calculate(expression: str) -> str:
     """
@@ -282,10 +305,7 @@ def calculate(expression: str) -> str:
     输入：合法的数学表达式，例如：'100 * 0.7 + 50' 或 '(30 + 70) / 2'
     """
     try:
-        allowed = set("0123456789+-*/(). ")
-        if not all(c in allowed for c in expression):
-            return "表达式包含非法字符，只支持基本数学运算"
-        result = eval(expression)
+        result = eval(_compile_expression(expression), {"__builtins__": {}}, {})
         return f"{expression} = {result}"
     except Exception as e:
         return f"计算失败：{e}"
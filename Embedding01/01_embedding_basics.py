@@ -12,11 +12,11 @@
   python 01_embedding_basics.py
 """
 
+import os
 import sys
+from functools import lru_cache
 import numpy as np
-import matplotlib.pyplot as plt
-import matplotlib
-from openai import OpenAI
+from embedding_client import OLLAMA_BASE_URL, make_client
 
 # Windows 终端默认 GBK 编码不支持部分 Unicode 字符，强制设为 UTF-8
 if sys.stdout.encoding and sys.stdout.encoding.lower() != "utf-8":
@@ -26,10 +26,8 @@ if sys.stdout.encoding and sys.stdout.encoding.lower() != "utf-8":
 
 # Ollama 在本地启动后，会在 11434 端口暴露一个与 OpenAI 完全兼容的 HTTP 接口。
 # 只需把 base_url 指向本地，api_key 填任意非空字符串即可（Ollama 不做鉴权）。
-client = OpenAI(
-    base_url="http://localhost:11434/v1",
-    api_key="ollama",           # 任意字符串，Ollama 不校验
-)
+# 连接池等细节见 embedding_client.py
+client = make_client()
 
 # 使用的 Embedding 模型名称，需与 ollama pull 时的名称一致
 EMBED_MODEL = "nomic-embed-text"
@@ -51,13 +49,47 @@ def get_embedding(text: str) -> list[float]:
         文本经过 Transformer 模型后，取 [CLS] token 或对所有 token 做平均池化，
         得到一个固定长度的浮点数向量，代表文本在语义空间中的位置。
     """
+    return list(_get_embedding_cached(EMBED_MODEL, text))
+
+
+@lru_cache(maxsize=1024)
+def _get_embedding_cached(model: str, text: str) -> tuple[float, ...]:
+    """
+    get_embedding 的实际实现，按 (模型, 文本) 缓存结果。
+
+    同一段文本重复查询时直接返回内存中的向量，省去一次 HTTP 往返。
+    返回 tuple 而不是 list：缓存的值会被多次共享，必须是不可变的。
+    """
     response = client.embeddings.create(
-        model=EMBED_MODEL,
+        model=model,
         input=[text],           # 接口接受列表，这里传入单元素列表
     )
     # response.data 是一个列表，每个元素对应输入列表中的一条文本
     # .embedding 属性就是向量本体，类型为 list[float]
-    return response.data[0].embedding
+    return tuple(response.data[0].embedding)
+
+
+def get_embeddings(texts: list[str]) -> list[list[float]]:
+    """
+    批量版本的 get_embedding：一次 HTTP 请求为多条文本生成向量。
+
+    参数：
+        texts: 需要向量化的文本列表
+
+    返回：
+        与 texts 顺序一一对应的向量列表
+
+    为什么要批量？
+        每次调用接口都有一次完整的 HTTP 往返（建连、序列化、排队），
+        文本很短时这部分开销远大于模型推理本身。把 N 条文本合并成一次请求，
+        往返次数从 N 次降为 1 次。
+    """
+    response = client.embeddings.create(
+        model=EMBED_MODEL,
+        input=texts,
+    )
+    # response.data 与 input 顺序一致
+    return [item.embedding for item in response.data]
 
 
 def cosine_similarity(vec_a: list[float], vec_b: list[float]) -> float:
@@ -76,11 +108,25 @@ def cosine_similarity(vec_a: list[float], vec_b: list[float]) -> float:
         Embedding 向量的长度（模）可能受文本长短影响，
         余弦相似度只关注方向，对长度不敏感，更适合语义比较。
     """
-    a = np.array(vec_a)
-    b = np.array(vec_b)
+    a = np.asarray(vec_a, dtype=np.float32)
+    b = np.asarray(vec_b, dtype=np.float32)
+    return cosine_sim_np(a, b)
+
+
+def cosine_sim_np(a: np.ndarray, b: np.ndarray, a_norm: float | None = None) -> float:
+    """
+    cosine_similarity 的 numpy 版本：直接接收 ndarray，避免每次调用都重新转换列表。
+
+    参数：
+        a, b   : 两个一维向量（推荐 float32）
+        a_norm : 可选，a 的 L2 范数。同一个向量 a 要和多个向量比较时，
+                 提前算好传进来，就不必每次重复计算
+    """
+    if a_norm is None:
+        a_norm = np.linalg.norm(a)
     # np.dot：点积（内积）
     # np.linalg.norm：计算向量的 L2 范数（即欧氏长度）
-    return float(np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b)))
+    return float(np.dot(a, b) / (a_norm * np.linalg.norm(b)))
 
 
 # ── 实验一：验证接口连通性 ───────────────────────────────────────────────────
@@ -130,20 +176,26 @@ def experiment_2_similarity_comparison():
         },
     ]
 
+    # 把所有组的句子展平成一个列表，只发一次请求拿到全部向量
+    keys = ("anchor", "similar", "unrelated")
+    all_texts = [group[key] for group in groups for key in keys]
+    all_vecs = get_embeddings(all_texts)
+
     for i, group in enumerate(groups, 1):
         print(f"\n--- 第 {i} 组 ---")
         print(f"锚   句: {group['anchor']}")
         print(f"相似句: {group['similar']}")
         print(f"无关句: {group['unrelated']}")
 
-        # 分别生成三个向量
-        vec_anchor    = get_embedding(group["anchor"])
-        vec_similar   = get_embedding(group["similar"])
-        vec_unrelated = get_embedding(group["unrelated"])
+        # 按顺序切回每组的三个向量
+        start = (i - 1) * len(keys)
+        vec_anchor, vec_similar, vec_unrelated = all_vecs[start : start + len(keys)]
 
-        # 计算相似度
-        sim_similar   = cosine_similarity(vec_anchor, vec_similar)
-        sim_unrelated = cosine_similarity(vec_anchor, vec_unrelated)
+        # 计算相似度：锚句向量和它的范数只转换 / 计算一次，与两个句子比较时复用
+        vec_anchor = np.asarray(vec_anchor, dtype=np.float32)
+        a_norm = np.linalg.norm(vec_anchor)
+        sim_similar   = cosine_sim_np(vec_anchor, np.asarray(vec_similar, dtype=np.float32), a_norm)
+        sim_unrelated = cosine_sim_np(vec_anchor, np.asarray(vec_unrelated, dtype=np.float32), a_norm)
 
         print(f"\n  锚句 <-> 相似句  余弦相似度: {sim_similar:.4f}  {'[高]' if sim_similar > 0.7 else ''}")
         print(f"  锚句 <-> 无关句  余弦相似度: {sim_unrelated:.4f}  {'（预期明显低于上面）' if sim_unrelated < sim_similar else ''}")
@@ -183,17 +235,27 @@ def experiment_3_heatmap():
     n = len(sentences)
     print(f"共 {n} 个句子，正在生成 Embedding（需要几秒钟）...")
 
-    # 生成所有句子的向量
-    embeddings = [get_embedding(s) for s in sentences]
+    # 一次批量请求生成所有句子的向量
+    embeddings = get_embeddings(sentences)
 
     # 构建 N×N 相似度矩阵
     # sim_matrix[i][j] = sentences[i] 与 sentences[j] 的余弦相似度
-    sim_matrix = np.zeros((n, n))
-    for i in range(n):
-        for j in range(n):
-            sim_matrix[i][j] = cosine_similarity(embeddings[i], embeddings[j])
+    # cosine_sim_matrix 在编译后的代码里一次算完全部 N² 个相似度（见 _fast.py），
+    # 无需 N² 次 Python 循环；未安装 numba 时退回归一化 + 一次矩阵乘法。
+    # _fast 会尝试导入 numba（本身就要几百毫秒），和下面的 matplotlib 一样只在实验三里导入
+    from _fast import cosine_sim_matrix
+
+    emb = np.asarray(embeddings, dtype=np.float32)
+    sim_matrix = cosine_sim_matrix(emb, emb)
 
     # ── 绘制热力图 ──────────────────────────────────────────────────────────
+    # matplotlib.pyplot 导入较慢（几百毫秒），只有实验三用到，因此在这里才导入。
+    # 没有图形界面的环境（如 Linux 服务器无 DISPLAY）先切到 Agg 后端，只输出图片文件
+    import matplotlib
+    if sys.platform.startswith("linux") and not os.environ.get("DISPLAY"):
+        matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
     # 使用支持中文显示的字体（若系统无 SimHei 则退回英文标签）
     try:
         matplotlib.rcParams["font.sans-serif"] = ["SimHei", "Arial Unicode MS", "DejaVu Sans"]
@@ -232,7 +294,6 @@ def experiment_3_heatmap():
 
     # 保存到文件（避免需要 GUI 环境）
     output_path = "data/heatmap.png"
-    import os
     os.makedirs("data", exist_ok=True)
     plt.savefig(output_path, dpi=150, bbox_inches="tight")
     print(f"热力图已保存至：{output_path}")
@@ -251,7 +312,7 @@ def experiment_3_heatmap():
 if __name__ == "__main__":
     print("\n【Embedding 基础概念验证】")
     print(f"使用模型：{EMBED_MODEL}")
-    print(f"Ollama 地址：http://localhost:11434/v1\n")
+    print(f"Ollama 地址：{OLLAMA_BASE_URL}\n")
 
     experiment_1_connectivity()
     experiment_2_similarity_comparison()
@@ -2,68 +2,133 @@
 03_embed_and_store.py
 =====================
 目标：读取清洗后的评论数据，批量调用 Ollama Embedding 接口，
-      将生成的向量保存到 CSV 文件中。
+      将生成的向量以二进制矩阵的形式保存到磁盘。
 
-输入：data/reviews_clean.csv（由 02_prepare_data.py 生成）
-输出：data/reviews_with_embeddings.csv
-      新增列 embedding：JSON 字符串，存储 768 维浮点向量
+输入：data/reviews_clean.parquet（由 02_prepare_data.py 生成）
+输出：data/embeddings_i8.npy、data/embeddings_scales.npy
+        shape (N, 768) 的 int8 矩阵（第 i 行对应第 i 条评论，已 L2 归一化后逐行量化）
+        及每行的缩放系数，供 04_semantic_search.py 直接加载
+      data/reviews_meta.parquet
+        评论元数据（Id, ProductId, Score, content），行顺序与矩阵一致
+
+为什么不把向量写进 CSV？
+  每个 768 维向量序列化成 JSON 文本约 15 KB，读取时还要逐行 json.loads；
+  int8 二进制每行只占 768 字节（外加一个缩放系数），np.load 一次即可拿到整个矩阵。
 
 运行方式：
   python 03_embed_and_store.py
 """
 
 import os
-import json
+import asyncio
+import numpy as np
 import pandas as pd
+import openai
 from tqdm import tqdm
-from openai import OpenAI
+from tqdm.asyncio import tqdm as tqdm_asyncio
+from _fast import quantize_rows
+from embedding_client import make_async_client
 
 # ── 配置 ──────────────────────────────────────────────────────────────────────
 
-INPUT_PATH  = "data/reviews_clean.csv"
-OUTPUT_PATH = "data/reviews_with_embeddings.csv"
+INPUT_PATH  = "data/reviews_clean.parquet"
+I8_PATH     = "data/embeddings_i8.npy"
+SCALES_PATH = "data/embeddings_scales.npy"
+META_PATH   = "data/reviews_meta.parquet"
 EMBED_MODEL = "nomic-embed-text"
 
 # 每次批量发送给 Ollama 的文本数量
-# 批量请求比逐条请求效率更高，16 是经验值
-BATCH_SIZE = 16
+# 批量越大，HTTP 往返次数越少；但过大的批次可能超时。
+# 默认 64，可通过环境变量 EMBED_BATCH_SIZE 按机器性能调整（CPU 可调小，GPU 可调大）。
+# 某批请求超时或服务端报错时，会自动对半拆分重试，见 embed_batch。
+BATCH_SIZE = int(os.environ.get("EMBED_BATCH_SIZE", 64))
+
+# 同时在途的批次数上限。Ollama 的 HTTP 服务可以并发接收请求，
+# 即使模型推理本身是串行的，也能把网络往返、JSON 编解码和推理重叠起来。
+# 太大只会让请求在 Ollama 端排队，3-8 是比较合适的范围
+MAX_INFLIGHT = 4
 
 # Ollama 本地服务，与 OpenAI SDK 完全兼容，只需改 base_url
-client = OpenAI(
-    base_url="http://localhost:11434/v1",
-    api_key="ollama",   # Ollama 不做鉴权，填任意字符串即可
-)
+# 使用异步客户端：所有批次在同一个事件循环里并发，不需要额外线程
+# 连接池保持长连接，并发批次复用已建立的连接（见 embedding_client.py）
+aclient = make_async_client()
+
+# ── 工具函数 ──────────────────────────────────────────────────────────────────
+
+async def embed_batch(batch: list[str], sem: asyncio.Semaphore) -> list[list[float]]:
+    """
+    为一批文本生成向量，返回顺序与输入一致。
+
+    sem 限制同时在途的请求数，只在真正发请求时持有，
+    这样下面拆分重试时的递归调用不会因为等待自己占着的名额而死锁。
+
+    若请求超时或 Ollama 返回 5xx，说明这批对当前硬件来说太大：
+    把它拆成两半分别递归请求，直到单条仍失败时才抛出异常。
+    """
+    try:
+        async with sem:
+            # input 传入列表，response.data 按顺序返回对应向量
+            response = await aclient.embeddings.create(model=EMBED_MODEL, input=batch)
+    except (openai.APITimeoutError, openai.InternalServerError) as e:
+        if len(batch) == 1:
+            raise
+        half = len(batch) // 2
+        tqdm.write(f"[自适应] 批大小 {len(batch)} 请求失败（{type(e).__name__}），拆分为 {half} + {len(batch) - half}")
+        return await embed_batch(batch[:half], sem) + await embed_batch(batch[half:], sem)
+    return [item.embedding for item in response.data]
+
+
+async def embed_all(batches: list[list[str]]) -> list[list[list[float]]]:
+    """
+    并发为所有批次生成向量，最多 MAX_INFLIGHT 个请求同时在途。
+
+    gather 按传入顺序返回结果，保证向量与评论行一一对应；
+    tqdm_asyncio.gather 在此基础上显示进度条。
+    """
+    sem = asyncio.Semaphore(MAX_INFLIGHT)
+    return await tqdm_asyncio.gather(
+        *(embed_batch(batch, sem) for batch in batches),
+        desc="生成 Embedding",
+        unit="批",
+    )
+
 
 # ── 主流程 ────────────────────────────────────────────────────────────────────
 
 def main():
     # 读取清洗后的数据
-    df = pd.read_csv(INPUT_PATH)
+    df = pd.read_parquet(INPUT_PATH)
     print(f"已加载 {len(df)} 条评论，开始生成 Embedding...")
 
     texts = df["content"].tolist()
-    all_embeddings = []
-
-    # 分批处理，tqdm 显示进度条
-    for i in tqdm(range(0, len(texts), BATCH_SIZE), desc="生成 Embedding", unit="批"):
-        batch = texts[i : i + BATCH_SIZE]
-
-        # 调用 Ollama Embedding 接口
-        # input 传入列表，response.data 按顺序返回对应向量
-        response = client.embeddings.create(model=EMBED_MODEL, input=batch)
+    batches = [texts[i : i + BATCH_SIZE] for i in range(0, len(texts), BATCH_SIZE)]
 
-        for item in response.data:
-            # 将 list[float] 序列化为 JSON 字符串，方便存入 CSV
-            # 读取时用 json.loads() 还原
-            all_embeddings.append(json.dumps(item.embedding))
+    # 多个批次并发请求，结果按批次顺序展平
+    results = asyncio.run(embed_all(batches))
+    all_embeddings = [vec for vectors in results for vec in vectors]
 
-    # 写入新列并保存
-    df["embedding"] = all_embeddings
+    # 向量矩阵存为 .npy，元数据存为 Parquet，行顺序与矩阵一一对应。
+    # 只保存 04_semantic_search.py 实际加载的 int8 矩阵和缩放系数。
     os.makedirs("data", exist_ok=True)
-    df.to_csv(OUTPUT_PATH, index=False, encoding="utf-8")
 
-    print(f"\n完成！已保存至 {OUTPUT_PATH}（{os.path.getsize(OUTPUT_PATH)/1024/1024:.1f} MB）")
-    print(f"向量维度：{len(json.loads(df['embedding'].iloc[0]))}")
+    # 矩阵生成后不再变化，归一化和量化都只需做一次：
+    # 每行除以自身的 L2 范数，之后余弦相似度就等于点积，搜索时直接用矩阵乘法。
+    # 加上极小值防止除以零
+    norm_matrix = np.asarray(all_embeddings, dtype=np.float32)
+    norm_matrix /= np.linalg.norm(norm_matrix, axis=1, keepdims=True) + 1e-10
+    # 再逐行量化为 int8，搜索时读取的数据量只有 float32 的 1/4
+    q_matrix, row_scales = quantize_rows(norm_matrix)
+    np.save(I8_PATH, q_matrix)
+    np.save(SCALES_PATH, row_scales)
+
+    df[["Id", "ProductId", "Score", "content"]].to_parquet(
+        META_PATH, engine="pyarrow", compression="snappy", index=False,
+    )
+
+    print(f"\n完成！int8 量化矩阵已保存至 {I8_PATH}（{os.path.getsize(I8_PATH)/1024/1024:.1f} MB）")
+    print(f"每行缩放系数已保存至 {SCALES_PATH}")
+    print(f"元数据已保存至 {META_PATH}（{os.path.getsize(META_PATH)/1024/1024:.1f} MB）")
+    print(f"向量矩阵形状：{q_matrix.shape}")
 
 
 if __name__ == "__main__":
@@ -1,37 +1,42 @@
 """
 04_semantic_search.py
 =====================
-目标：读取含 Embedding 向量的 CSV 文件，对用户输入的自然语言查询
+目标：读取评论向量矩阵和元数据，对用户输入的自然语言查询
       进行语义搜索，返回语义最相似的 Top-K 条评论。
 
 核心原理：
-  1. 将所有评论的向量加载到内存，拼成一个 (N, 768) 的矩阵
-  2. 对查询文本同样生成一个 768 维向量
+  1. 将所有评论的向量加载到内存，得到一个已 L2 归一化、逐行量化为 int8 的 (N, 768) 矩阵
+  2. 对查询文本同样生成一个 768 维向量，并以相同方式归一化、量化
   3. 用矩阵乘法一次性计算查询向量与所有行的余弦相似度
   4. 取相似度最高的 K 行输出
 
 为什么不需要向量数据库？
-  1000 条 × 768 维 ≈ 6 MB 内存，numpy 矩阵运算在毫秒级完成，
+  1000 条 × 768 维 int8 ≈ 0.75 MB 内存，矩阵运算在毫秒级完成，
   完全不需要引入额外的基础设施。
 
-输入：data/reviews_with_embeddings.csv（由 03_embed_and_store.py 生成）
+输入：data/embeddings_i8.npy、data/embeddings_scales.npy、data/reviews_meta.parquet
+      （由 03_embed_and_store.py 生成）
 
 运行方式：
   python 04_semantic_search.py
 """
 
-import json
+import heapq
+import re
 import sys
+from collections import OrderedDict
 import numpy as np
 import pandas as pd
-from openai import OpenAI
+from _fast import matvec_i8, quantize_rows
+from embedding_client import make_client
 
 # ── 配置参数 ──────────────────────────────────────────────────────────────────
 
-INPUT_PATH = "data/reviews_with_embeddings.csv"
+I8_PATH     = "data/embeddings_i8.npy"
+SCALES_PATH = "data/embeddings_scales.npy"
+META_PATH   = "data/reviews_meta.parquet"
 
-OLLAMA_BASE_URL = "http://localhost:11434/v1"
-EMBED_MODEL     = "nomic-embed-text"
+EMBED_MODEL = "nomic-embed-text"
 
 # 默认返回最相似的前 K 条结果
 DEFAULT_TOP_K = 5
@@ -39,61 +44,106 @@ DEFAULT_TOP_K = 5
 # 打印评论正文时，截取的最大字符数（避免输出太长）
 PREVIEW_CHARS = 200
 
+# 行数超过该值时改为分块搜索（见 topk_tiled）。
+# 每块 TILE_ROWS 行 × 768 维 int8 ≈ 0.75 MB，正好放得进 CPU 的 L2 缓存
+TILED_SEARCH_MIN_ROWS = 100_000
+TILE_ROWS = 1024
+
+# 交互模式下的评分过滤前缀，例如 "[5星] best coffee"
+SCORE_PREFIX_RE = re.compile(r"^\[(\d)星\]\s*")
+
 
 # ── 初始化客户端 ──────────────────────────────────────────────────────────────
 
-client = OpenAI(
-    base_url=OLLAMA_BASE_URL,
-    api_key="ollama",
-)
+# 交互模式下每次查询都复用同一条长连接（见 embedding_client.py）
+client = make_client()
 
 
-# ── 数据加载 ──────────────────────────────────────────────────────────────────
+# ── 查询向量 ──────────────────────────────────────────────────────────────────
+
+# 按 (模型, 文本) 缓存查询向量，超过容量时淘汰最久没用的一条。
+# 没有用 functools.lru_cache：批量搜索要先查出哪些查询已经缓存、只为剩下的发请求，
+# lru_cache 不支持"只查不算"，也不能把批量请求的结果放进去。
+QUERY_CACHE_SIZE = 1024
+_query_cache: OrderedDict[tuple[str, str], tuple[float, ...]] = OrderedDict()
+
 
-def load_data(path: str) -> tuple[pd.DataFrame, np.ndarray]:
+def get_query_embeddings(model: str, texts: list[str]) -> list[tuple[float, ...]]:
     """
-    加载 CSV 文件，解析 embedding 列，返回 DataFrame 和向量矩阵。
+    为多条查询文本生成向量，返回与 texts 顺序对应的列表。
 
-    返回：
-        df            : 原始 DataFrame（含 Id, Score, content 等列）
-        embed_matrix  : shape (N, D) 的 numpy 浮点矩阵，D 为向量维度（768）
+    已缓存的直接从内存取，没缓存的（去重后）合并成一次 Embedding 请求，结果写回缓存。
+    演示查询和交互模式下经常重复搜索同一句话，全部命中时不用请求 Ollama。
+    返回不可变的 tuple，调用方再用 np.asarray 转为 float32 向量。
     """
-    print(f"正在加载 {path} ...")
-    df = pd.read_csv(path)
+    keys = [(model, text) for text in texts]
+    for key in keys:
+        if key in _query_cache:
+            _query_cache.move_to_end(key)
+
+    misses = list(dict.fromkeys(text for key, text in zip(keys, texts) if key not in _query_cache))
+    fetched = {}
+    if misses:
+        response = client.embeddings.create(model=model, input=misses)
+        fetched = {text: tuple(item.embedding) for text, item in zip(misses, response.data)}
 
-    if "embedding" not in df.columns:
-        raise ValueError("CSV 中缺少 embedding 列，请先运行 03_embed_and_store.py")
+    # 先取结果再写缓存：本批查询很多时，写入新向量可能把本批刚命中的条目淘汰掉
+    vectors = [fetched[text] if text in fetched else _query_cache[key] for key, text in zip(keys, texts)]
+    for text, vec in fetched.items():
+        _query_cache[(model, text)] = vec
+    while len(_query_cache) > QUERY_CACHE_SIZE:
+        _query_cache.popitem(last=False)
+    return vectors
 
-    # 将每一行的 JSON 字符串还原为 list[float]，再堆叠成二维 numpy 矩阵
-    # np.stack：把 N 个长度为 D 的列表竖向叠放，得到 (N, D) 矩阵
-    vectors = [json.loads(row) for row in df["embedding"]]
-    embed_matrix = np.stack(vectors).astype(np.float32)   # float32 节省内存、加速计算
 
-    print(f"加载完成：{len(df)} 条评论，向量矩阵形状 {embed_matrix.shape}")
-    return df, embed_matrix
+def get_query_embedding(model: str, text: str) -> tuple[float, ...]:
+    """单条查询版的 get_query_embeddings"""
+    return get_query_embeddings(model, [text])[0]
 
 
-# ── 向量归一化 ────────────────────────────────────────────────────────────────
+# ── 数据加载 ──────────────────────────────────────────────────────────────────
 
-def normalize_matrix(matrix: np.ndarray) -> np.ndarray:
+def load_data(
+    meta_path: str, i8_path: str, scales_path: str,
+) -> tuple[pd.DataFrame, np.ndarray, np.ndarray]:
     """
-    对矩阵的每一行做 L2 归一化（使每行向量的模为 1）。
+    加载元数据 Parquet 和量化后的向量矩阵，返回 DataFrame、int8 矩阵和每行缩放系数。
 
-    为什么要归一化？
+    为什么加载的是归一化后的矩阵？
         归一化后，余弦相似度可以简化为点积：
             cos(a, b) = a_norm · b_norm
-        这样对整个矩阵只需一次矩阵乘法，效率极高。
-
-    参数：
-        matrix: shape (N, D)
+        矩阵在 03_embed_and_store.py 中只归一化、量化一次并存盘，
+        这里直接加载，每次启动都省去一遍 N×D 的开方和除法。
 
     返回：
-        shape (N, D)，每行的 L2 范数为 1
+        df          : 原始 DataFrame（含 Id, Score, content 等列）
+        q_matrix    : shape (N, D) 的 int8 矩阵，D 为向量维度（768）
+        row_scales  : shape (N,) 的 float32，第 i 行还原为浮点向量即 q_matrix[i] / row_scales[i]
     """
-    # keepdims=True：保持维度 (N, 1)，方便广播除法
-    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
-    # 加上极小值防止除以零（理论上不会发生，但作为保护）
-    return matrix / (norms + 1e-10)
+    print(f"正在加载 {meta_path} 和 {i8_path} ...")
+    df = pd.read_parquet(meta_path)
+    q_matrix = np.load(i8_path)
+    row_scales = np.load(scales_path)
+
+    if len(df) != q_matrix.shape[0]:
+        raise ValueError(
+            f"元数据行数（{len(df)}）与向量行数（{q_matrix.shape[0]}）不一致，"
+            "请重新运行 03_embed_and_store.py"
+        )
+
+    print(f"加载完成：{len(df)} 条评论，向量矩阵形状 {q_matrix.shape}\n")
+    return df, q_matrix, row_scales
+
+
+def build_score_index(df: pd.DataFrame) -> dict[int, np.ndarray]:
+    """
+    预先按评分分组行号：{评分: 该评分所有行的行号数组}。
+
+    数据加载后只需构建一次。按评分过滤的查询直接取出对应行号，
+    只在这部分行上计算相似度，无需每次查询都对全部 N 行生成掩码再覆盖分数。
+    """
+    scores = df["Score"].to_numpy()
+    return {int(s): np.flatnonzero(scores == s) for s in np.unique(scores)}
 
 
 # ── 语义搜索 ──────────────────────────────────────────────────────────────────
@@ -101,9 +151,11 @@ def normalize_matrix(matrix: np.ndarray) -> np.ndarray:
 def semantic_search(
     query: str,
     df: pd.DataFrame,
-    norm_matrix: np.ndarray,
+    q_matrix: np.ndarray,
+    row_scales: np.ndarray,
     top_k: int = DEFAULT_TOP_K,
     score_filter: int | None = None,
+    score_index: dict[int, np.ndarray] | None = None,
 ) -> pd.DataFrame:
     """
     对自然语言查询执行语义搜索，返回最相似的 Top-K 条评论。
@@ -111,41 +163,139 @@ def semantic_search(
     参数：
         query        : 用户输入的查询字符串
         df           : 评论 DataFrame
-        norm_matrix  : 已归一化的向量矩阵，shape (N, 768)
+        q_matrix     : 已归一化并量化的 int8 向量矩阵，shape (N, 768)
+        row_scales   : q_matrix 每行的缩放系数，shape (N,)
         top_k        : 返回结果数量
         score_filter : 若不为 None，只在指定评分（1-5）的评论中搜索
+        score_index  : build_score_index 的结果；未提供时按需现算
 
     返回：
         包含 [score, similarity, content] 列的 DataFrame，按相似度降序排列
     """
-    # 步骤 A：生成查询向量
-    response = client.embeddings.create(
-        model=EMBED_MODEL,
-        input=[query],
-    )
-    query_vec = np.array(response.data[0].embedding, dtype=np.float32)
-
-    # 步骤 B：归一化查询向量（与矩阵归一化方式相同）
-    query_norm = query_vec / (np.linalg.norm(query_vec) + 1e-10)
+    # 步骤 A：生成查询向量（重复查询命中缓存，不再发请求）
+    query_vec = np.asarray(get_query_embedding(EMBED_MODEL, query), dtype=np.float32)
 
-    # 步骤 C：计算相似度
-    # norm_matrix @ query_norm：矩阵-向量乘法
-    # 结果 scores 形状为 (N,)，scores[i] 就是第 i 条评论与查询的余弦相似度
-    scores = norm_matrix @ query_norm
+    # 步骤 B：归一化并量化查询向量（与矩阵的处理方式相同）
+    query_norm = query_vec / (np.linalg.norm(query_vec) + 1e-10)
+    query_i8, query_scale = quantize_rows(query_norm)
 
-    # 步骤 D：（可选）按评分过滤
-    # 如果指定了 score_filter，将不符合评分的行的相似度设为 -1（排在最后）
+    # 步骤 C：（可选）按评分过滤，确定参与计算的行
+    # 指定了 score_filter 时只取该评分的行号，后面只在这些行上算相似度
+    row_ids = None
     if score_filter is not None:
-        mask = df["Score"].values != score_filter   # 不符合评分的位置为 True
-        scores[mask] = -1.0                         # 强制置为最低分，不会被选中
+        if score_index is None:
+            score_index = build_score_index(df)
+        row_ids = score_index.get(score_filter, np.empty(0, dtype=np.intp))
+        q_matrix, row_scales = q_matrix[row_ids], row_scales[row_ids]
+
+    # 步骤 D：计算相似度
+    # 数据量很大时分块计算，边算边维护 Top-K，见 topk_tiled
+    if len(q_matrix) >= TILED_SEARCH_MIN_ROWS:
+        top_indices, top_scores = topk_tiled(q_matrix, row_scales, query_i8, query_scale, top_k)
+        if row_ids is not None:
+            top_indices = row_ids[top_indices]
+        return build_results(df, top_indices, top_scores)
+
+    # matvec_i8 即 q_matrix @ query_i8：int8 矩阵-向量乘法，int32 累加（numba 并行编译版，见 _fast.py）
+    # 再除以两边的缩放系数还原成浮点数，scores[i] 就是第 i 行评论与查询的余弦相似度
+    scores = matvec_i8(q_matrix, query_i8) / (row_scales * query_scale)
+
+    # 步骤 E：取 Top-K 并构造结果
+    return top_k_results(scores, df, top_k, row_ids)
+
+
+def topk_tiled(
+    q_matrix: np.ndarray,
+    row_scales: np.ndarray,
+    query_i8: np.ndarray,
+    query_scale: np.ndarray,
+    top_k: int,
+    tile: int = TILE_ROWS,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    分块计算相似度，用一个大小为 K 的最小堆维护目前为止的 Top-K。
+
+    为什么要分块？
+        行数达到数十万时，矩阵远大于 CPU 缓存，一次算完还要再分配并遍历一个 N 长的分数数组。
+        按 tile 行一块处理：每块只读一次、在缓存内算完，只把这一块的前 K 名放进堆，
+        计算量不变，但内存流量更小。
+
+    返回：
+        (行号数组, 相似度数组)，按相似度降序排列
+    """
+    best: list[tuple[float, int]] = []   # 最小堆，堆顶是当前 Top-K 中最小的
+    for start in range(0, len(q_matrix), tile):
+        end = start + tile
+        scores = matvec_i8(q_matrix[start:end], query_i8) / (row_scales[start:end] * query_scale)
+        k = min(top_k, len(scores))
+        for j in np.argpartition(-scores, k - 1)[:k]:
+            item = (float(scores[j]), start + int(j))
+            if len(best) < top_k:
+                heapq.heappush(best, item)
+            elif item > best[0]:
+                heapq.heapreplace(best, item)
+
+    best.sort(reverse=True)
+    top_indices = np.array([i for _, i in best], dtype=np.intp)
+    top_scores = np.array([v for v, _ in best], dtype=np.float32)
+    return top_indices, top_scores
+
+
+def semantic_search_batch(
+    queries: list[str],
+    df: pd.DataFrame,
+    q_matrix: np.ndarray,
+    row_scales: np.ndarray,
+    top_k: int = DEFAULT_TOP_K,
+) -> list[pd.DataFrame]:
+    """
+    一次性对多条查询执行语义搜索，返回与 queries 顺序对应的结果列表。
+
+    与逐条调用 semantic_search 的区别：
+        - 查询向量和 semantic_search 共用同一个缓存，没缓存的查询合并成一次 Embedding 请求，
+          省去逐条请求的 HTTP 往返
+        - 相似度用一次矩阵乘法 q_matrix @ Q.T 算出，shape (N, Q)，
+          第 j 列就是第 j 条查询与全部评论的相似度
+    """
+    Q = np.asarray(get_query_embeddings(EMBED_MODEL, queries), dtype=np.float32)
+    Q /= np.linalg.norm(Q, axis=1, keepdims=True) + 1e-10
+    Q_i8, q_scales = quantize_rows(Q)
+
+    all_scores = np.matmul(q_matrix, Q_i8.T, dtype=np.int32) / np.outer(row_scales, q_scales)
+    return [top_k_results(all_scores[:, j], df, top_k) for j in range(len(queries))]
+
+
+def top_k_results(
+    scores: np.ndarray,
+    df: pd.DataFrame,
+    top_k: int,
+    row_ids: np.ndarray | None = None,
+) -> pd.DataFrame:
+    """
+    从相似度数组中取最高的 K 条，构造结果 DataFrame。
+
+    只需要最大的 K 个，没必要对全部 N 个分数做完整排序（O(N log N)）。
+    np.argpartition 在 O(N) 内把最大的 K 个挪到前面（对 -scores 取最小即取最大），
+    再只对这 K 个做排序，得到从大到小的顺序。
+
+    row_ids 不为 None 时，scores[i] 对应的是 df 的第 row_ids[i] 行（按评分过滤后的子集）。
+    """
+    k = min(top_k, len(scores))
+    if k == 0:
+        return build_results(df, np.empty(0, dtype=np.intp), np.empty(0, dtype=np.float32))
+    top_indices = np.argpartition(-scores, k - 1)[:k]
+    top_indices = top_indices[np.argsort(-scores[top_indices])]
+    top_scores = scores[top_indices]
+    if row_ids is not None:
+        top_indices = row_ids[top_indices]
+
+    return build_results(df, top_indices, top_scores)
 
-    # 步骤 E：取 Top-K
-    # np.argsort 返回从小到大的排序索引，[::-1] 反转为从大到小
-    top_indices = np.argsort(scores)[::-1][:top_k]
 
-    # 步骤 F：构造结果 DataFrame
+def build_results(df: pd.DataFrame, top_indices: np.ndarray, top_scores: np.ndarray) -> pd.DataFrame:
+    """按行号取出评论，附上相似度，构造结果 DataFrame。"""
     results = df.iloc[top_indices].copy()
-    results["similarity"] = scores[top_indices]
+    results["similarity"] = top_scores
 
     return results[["Score", "similarity", "content"]].reset_index(drop=True)
 
@@ -159,14 +309,16 @@ def print_results(query: str, results: pd.DataFrame) -> None:
     print(f"Top-{len(results)} 相似评论：")
     print(f"{'─' * 60}")
 
-    for rank, (_, row) in enumerate(results.iterrows(), 1):
+    # 直接按列 zip 遍历，避免 iterrows 为每一行构造一个 Series
+    rows = zip(results["Score"].to_numpy(), results["similarity"].to_numpy(), results["content"].to_numpy())
+    for rank, (score, similarity, content) in enumerate(rows, 1):
         # 将星级数字转成星号符号，更直观
-        stars = "★" * int(row["Score"]) + "☆" * (5 - int(row["Score"]))
-        preview = row["content"][:PREVIEW_CHARS]
-        if len(row["content"]) > PREVIEW_CHARS:
+        stars = "★" * int(score) + "☆" * (5 - int(score))
+        preview = content[:PREVIEW_CHARS]
+        if len(content) > PREVIEW_CHARS:
             preview += "..."
 
-        print(f"\n#{rank}  相似度: {row['similarity']:.4f}  评分: {stars}")
+        print(f"\n#{rank}  相似度: {similarity:.4f}  评分: {stars}")
         print(f"    {preview}")
 
     print(f"\n{'─' * 60}\n")
@@ -191,16 +343,14 @@ DEMO_QUERIES = [
 def main():
     # ── 加载数据 ─────────────────────────────────────────────────────────────
     try:
-        df, embed_matrix = load_data(INPUT_PATH)
-    except FileNotFoundError:
-        print(f"[错误] 找不到文件：{INPUT_PATH}")
-        print("请先运行 03_embed_and_store.py 生成含向量的 CSV 文件。")
+        df, q_matrix, row_scales = load_data(META_PATH, I8_PATH, SCALES_PATH)
+    except FileNotFoundError as e:
+        print(f"[错误] 找不到文件：{e.filename}")
+        print("请先运行 03_embed_and_store.py 生成向量矩阵和元数据文件。")
         sys.exit(1)
 
-    # ── 预处理：对整个矩阵做一次归一化，后续搜索无需重复计算 ─────────────────
-    print("正在对向量矩阵做 L2 归一化（只需一次）...")
-    norm_matrix = normalize_matrix(embed_matrix)
-    print("归一化完成。\n")
+    # 按评分分组的行号，交互模式下 [N星] 过滤直接使用
+    score_index = build_score_index(df)
 
     # ── 模式选择 ─────────────────────────────────────────────────────────────
     print("请选择运行模式：")
@@ -212,8 +362,9 @@ def main():
     if choice == "1":
         # ── 演示模式：依次运行预置查询 ─────────────────────────────────────
         print(f"\n运行 {len(DEMO_QUERIES)} 个预置查询...\n")
-        for query in DEMO_QUERIES:
-            results = semantic_search(query, df, norm_matrix, top_k=DEFAULT_TOP_K)
+        # 所有演示查询合并成一次 Embedding 请求
+        all_results = semantic_search_batch(DEMO_QUERIES, df, q_matrix, row_scales, top_k=DEFAULT_TOP_K)
+        for query, results in zip(DEMO_QUERIES, all_results):
             print_results(query, results)
 
     elif choice == "2":
@@ -232,8 +383,7 @@ def main():
 
             # 解析评分过滤前缀，例如 "[5星] best coffee"
             score_filter = None
-            import re
-            match = re.match(r"^\[(\d)星\]\s*", query)
+            match = SCORE_PREFIX_RE.match(query) if query.startswith("[") else None
             if match:
                 score_filter = int(match.group(1))
                 query = query[match.end():]    # 去掉前缀，保留真正的查询内容
@@ -244,9 +394,10 @@ def main():
                 continue
 
             results = semantic_search(
-                query, df, norm_matrix,
+                query, df, q_matrix, row_scales,
                 top_k=DEFAULT_TOP_K,
                 score_filter=score_filter,
+                score_index=score_index,
             )
             print_results(query, results)
 
@@ -0,0 +1,118 @@
+"""
+_fast.py
+========
+余弦相似度计算的 Numba 加速版本和 int8 量化工具，
+供 01_embedding_basics.py、03_embed_and_store.py 和 04_semantic_search.py 调用。
+
+为什么单独放一个模块？
+  Numba 的 @njit 会把函数编译成机器码：循环在编译后的代码里执行，
+  没有 Python 解释器开销，prange 还能把外层循环分到多个 CPU 核心上。
+  cache=True 会把编译结果缓存到 __pycache__，第二次运行起不再重复编译。
+
+Numba 是可选依赖（pip install numba）：未安装时自动退回等价的 numpy 实现，
+结果相同，只是少了 JIT 加速。
+"""
+
+import numpy as np
+
+try:
+    from numba import njit, prange
+except ImportError:
+    njit = None
+
+
+if njit is not None:
+
+    @njit(fastmath=True, cache=True)
+    def _dot(a: np.ndarray, b: np.ndarray) -> float:
+        """两个一维向量的点积。手写循环，避免 numba 的 np.dot 依赖 SciPy BLAS。"""
+        acc = 0.0
+        for k in range(a.shape[0]):
+            acc += a[k] * b[k]
+        return acc
+
+    @njit(parallel=True, fastmath=True, cache=True)
+    def cosine_sim_matrix(A: np.ndarray, B: np.ndarray) -> np.ndarray:
+        """
+        计算 A 的每一行与 B 的每一行之间的余弦相似度。
+
+        参数：
+            A: shape (M, D) 的 float32 矩阵
+            B: shape (N, D) 的 float32 矩阵
+
+        返回：
+            shape (M, N) 的 float32 矩阵，C[i, j] = cos(A[i], B[j])
+
+        范数在循环里就地计算（np.sqrt(row · row)），
+        不需要先分配一份归一化后的矩阵副本。
+        """
+        m, n = A.shape[0], B.shape[0]
+        b_norms = np.empty(n, dtype=np.float32)
+        for j in prange(n):
+            b_norms[j] = np.sqrt(_dot(B[j], B[j])) + 1e-10
+
+        C = np.empty((m, n), dtype=np.float32)
+        for i in prange(m):
+            a_norm = np.sqrt(_dot(A[i], A[i])) + 1e-10
+            for j in range(n):
+                C[i, j] = _dot(A[i], B[j]) / (a_norm * b_norms[j])
+        return C
+
+    @njit(parallel=True, cache=True)
+    def matvec_i8(Q: np.ndarray, q: np.ndarray) -> np.ndarray:
+        """
+        计算 int8 矩阵 Q 的每一行与 int8 向量 q 的点积，用 int32 累加。
+
+        参数：
+            Q: shape (N, D) 的 int8 矩阵
+            q: shape (D,) 的 int8 向量
+
+        返回：
+            shape (N,) 的 int32 向量（尚未乘回缩放系数）
+
+        为什么不能用 int16 累加？
+            768 × 127 × 127 ≈ 1200 万，远超 int16 上限 32767，必须用 int32。
+        """
+        n, d = Q.shape
+        out = np.empty(n, dtype=np.int32)
+        for i in prange(n):
+            acc = np.int32(0)
+            for k in range(d):
+                acc += np.int32(Q[i, k]) * np.int32(q[k])
+            out[i] = acc
+        return out
+
+else:
+
+    def cosine_sim_matrix(A: np.ndarray, B: np.ndarray) -> np.ndarray:
+        """cosine_sim_matrix 的 numpy 版本：逐行归一化后做一次矩阵乘法。"""
+        A = A / (np.linalg.norm(A, axis=1, keepdims=True) + 1e-10)
+        B = B / (np.linalg.norm(B, axis=1, keepdims=True) + 1e-10)
+        return (A @ B.T).astype(np.float32)
+
+    def matvec_i8(Q: np.ndarray, q: np.ndarray) -> np.ndarray:
+        """matvec_i8 的 numpy 版本：matmul 按 int32 计算，避免溢出。"""
+        return np.matmul(Q, q, dtype=np.int32)
+
+
+def quantize_rows(M: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    把浮点矩阵逐行量化为 int8。
+
+    每行乘以各自的缩放系数 scale = 127 / max(|row|)，使该行最大分量恰好映射到 ±127，
+    再四舍五入存为 int8。还原时 row ≈ Q_row / scale。
+
+    参数：
+        M: shape (N, D) 或 (D,) 的浮点矩阵 / 向量
+
+    返回：
+        Q      : 与 M 同形状的 int8 数组
+        scales : shape (N,) 的 float32 缩放系数（输入为一维时是标量数组）
+
+    为什么要量化？
+        int8 只占 float32 的 1/4：内存和每次搜索需要读取的数据量都降为 1/4。
+        对于排序（Top-K）来说，量化误差远小于相似度之间的差距，结果基本不变。
+    """
+    scales = 127.0 / (np.max(np.abs(M), axis=-1, keepdims=True) + 1e-10)
+    Q = np.round(M * scales).astype(np.int8)
+    return Q, np.squeeze(scales, axis=-1).astype(np.float32)
@@ -0,0 +1,49 @@
+"""
+embedding_client.py
+===================
+创建指向本地 Ollama 的 OpenAI 客户端，供 01 / 03 / 04 脚本共用同一套连接配置。
+
+为什么要自己传 http_client？
+  SDK 默认的 httpx 连接池较保守。这里显式配置：
+    - 保持长连接（keep-alive），连续请求复用同一条 TCP 连接，省去每次握手
+    - 放宽连接池上限，03_embed_and_store.py 并发发送批次时不会在池上排队
+    - 读超时放宽到 300 秒：大批次在 CPU 上推理可能很慢，但连接阶段 10 秒就该失败
+
+为什么没有开 HTTP/2？
+  httpx 只在 HTTPS 上通过 ALPN 协商 HTTP/2，而 Ollama 在本机用明文 HTTP 提供服务，
+  开了也会退回 HTTP/1.1。对 localhost 来说，长连接复用才是真正起作用的部分。
+"""
+
+import httpx
+from openai import AsyncOpenAI, OpenAI
+
+# Ollama 在本地启动后，会在 11434 端口暴露一个与 OpenAI 完全兼容的 HTTP 接口
+OLLAMA_BASE_URL = "http://localhost:11434/v1"
+
+# Ollama 不做鉴权，填任意非空字符串即可
+OLLAMA_API_KEY = "ollama"
+
+POOL_LIMITS = httpx.Limits(
+    max_keepalive_connections=40,
+    max_connections=100,
+    keepalive_expiry=30.0,
+)
+TIMEOUT = httpx.Timeout(300.0, connect=10.0)
+
+
+def make_client() -> OpenAI:
+    """创建同步客户端，底层连接池在整个进程内复用。"""
+    return OpenAI(
+        base_url=OLLAMA_BASE_URL,
+        api_key=OLLAMA_API_KEY,
+        http_client=httpx.Client(limits=POOL_LIMITS, timeout=TIMEOUT),
+    )
+
+
+def make_async_client() -> AsyncOpenAI:
+    """创建异步客户端，供 asyncio 并发请求使用。"""
+    return AsyncOpenAI(
+        base_url=OLLAMA_BASE_URL,
+        api_key=OLLAMA_API_KEY,
+        http_client=httpx.AsyncClient(limits=POOL_LIMITS, timeout=TIMEOUT),
+    )
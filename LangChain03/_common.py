@@ -0,0 +1,100 @@
+"""
+_common.py
+==========
+LangChain03 各 demo 共用的初始化代码：
+
+  - 把标准输出设为 UTF-8（Windows 终端默认 GBK，打印中文会乱码）
+  - 从环境变量读取 DeepSeek API Key
+  - get_model(temperature)：按参数缓存的 ChatDeepSeek 工厂，相同参数只创建一次
+  - 共用的 model（temperature=0.7）和 StrOutputParser
+  - 给模型配置显式的 httpx 连接池，所有模型实例共用同一个池
+
+为什么自己传 http_client？
+  DeepSeek 走 HTTPS，httpx 可以通过 ALPN 协商到 HTTP/2：
+  batch() / ainvoke() 发出的多个并发请求复用同一条 TCP + TLS 连接多路传输，
+  而不是各开一条连接、各做一次握手。keep-alive 连接池让连续调用也不必重新握手。
+  同步调用（invoke / batch）用 http_client，异步调用（ainvoke）用 http_async_client。
+  HTTP/2 需要额外的 h2 包（pip install "httpx[http2]"）。
+
+enable_llm_cache()：开启本地 SQLite LLM 缓存（demo03~05 使用）
+  开发时反复运行 demo，发出的提示词一模一样。
+  开启缓存后，相同的（提示词 + 模型参数）第二次起直接从本地文件返回，
+  不再请求 DeepSeek：省 token，也省掉 1~3 秒的等待。
+  只有 invoke() / batch() 会查缓存，stream() 每次都会真正请求模型。
+  缓存文件固定在本目录下的 .langchain_cache.db（不随运行时的当前目录变化），
+  想看到模型的新回答时，删掉它即可。
+
+run_async(coro)：异步 demo 的统一入口
+  - 所有调用共用同一个事件循环：HTTP_ASYNC_CLIENT 连接池里的连接绑定在创建它的事件循环上，
+    每次都 asyncio.run() 新建循环的话，第二次调用会拿到属于已关闭循环的旧连接
+  - 装了 uvloop（pip install uvloop，基于 libuv，不支持 Windows）就用它做事件循环，
+    大量并发的网络读写更快；没装时退回标准 asyncio，结果相同
+
+ChatModel 的各个参数在 demo01_chat_model.py 里有逐行讲解；
+demo07 的 Agent 需要 temperature=0，通过 get_model(temperature=0) 获取。
+"""
+
+import asyncio
+import atexit
+import os
+import sys
+from functools import lru_cache
+from pathlib import Path
+
+import httpx
+from langchain_core.output_parsers import StrOutputParser
+from langchain_deepseek import ChatDeepSeek
+
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
+sys.stdout.reconfigure(encoding="utf-8")
+
+DEEPSEEK_API_KEY = os.environ.get("DEEPSEEK_API_KEY")
+
+POOL_LIMITS = httpx.Limits(max_keepalive_connections=20, max_connections=40)
+
+# 连接池是进程级的：不同 temperature 的模型实例也共用这两个客户端
+HTTP_CLIENT = httpx.Client(http2=True, limits=POOL_LIMITS)
+HTTP_ASYNC_CLIENT = httpx.AsyncClient(http2=True, limits=POOL_LIMITS)
+
+
+@lru_cache(maxsize=8)
+def get_model(*, temperature: float = 0.7, model: str = "deepseek-chat") -> ChatDeepSeek:
+    """按 (temperature, model) 缓存的 ChatDeepSeek 工厂，同样的参数返回同一个实例"""
+    return ChatDeepSeek(
+        model=model,
+        api_key=DEEPSEEK_API_KEY,
+        temperature=temperature,
+        http_client=HTTP_CLIENT,
+        http_async_client=HTTP_ASYNC_CLIENT,
+    )
+
+
+model = get_model()
+parser = StrOutputParser()
+
+# 按本文件所在目录定位，从仓库根目录运行 python LangChain03/xxx.py 也写到这里
+LLM_CACHE_PATH = Path(__file__).with_name(".langchain_cache.db")
+
+
+def enable_llm_cache() -> None:
+    """开启本地 SQLite LLM 缓存（全局生效，对之后所有模型调用都有效）"""
+    # langchain_community 导入较慢，只在需要缓存的 demo 里才导入
+    from langchain_core.globals import set_llm_cache
+    from langchain_community.cache import SQLiteCache
+
+    set_llm_cache(SQLiteCache(database_path=str(LLM_CACHE_PATH)))
+
+
+# asyncio.Runner 在多次 run() 之间保留同一个事件循环；
+# Runner 本身不会自动关闭，注册到 atexit，进程退出时关掉事件循环
+_ASYNC_RUNNER = asyncio.Runner(loop_factory=uvloop.new_event_loop if uvloop else None)
+atexit.register(_ASYNC_RUNNER.close)
+
+
+def run_async(coro):
+    """在共用的事件循环里运行协程并返回结果，用法同 asyncio.run()"""
+    return _ASYNC_RUNNER.run(coro)
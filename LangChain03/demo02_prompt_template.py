@@ -1,11 +1,7 @@
-import os
-import sys
-from langchain_deepseek import ChatDeepSeek
+from _common import model
 from langchain_core.prompts import ChatPromptTemplate, PromptTemplate
 from langchain_core.messages import SystemMessage, HumanMessage
 
-sys.stdout.reconfigure(encoding="utf-8")
-
 # ============================================================
 # PromptTemplate 是什么？为什么需要它？
 #
@@ -30,11 +26,7 @@ sys.stdout.reconfigure(encoding="utf-8")
 #   2. ChatPromptTemplate   —— 用于对话格式（有角色区分），更常用
 # ============================================================
 
-model = ChatDeepSeek(
-    model="deepseek-chat",
-    api_key=os.environ.get("DEEPSEEK_API_KEY"),
-    temperature=0.7,
-)
+# model 在 _common.py 中统一创建（ChatModel 参数说明见 demo01）
 
 
 # ============================================================
@@ -127,29 +119,32 @@ print("Part 3：Chain（模板 | 模型）")
 print("=" * 55)
 
 # 定义一个代码生成模板
+# 系统提示保持固定不变，变量都放在后面的 human 消息里：
+# DeepSeek 会自动缓存请求中相同的前缀（上下文硬盘缓存），命中部分的输入 token 价格大幅降低。
+# 如果把 {language} 放进系统提示，Python 和 JavaScript 两次请求从第一句话就不同，前缀无法复用。
 code_template = ChatPromptTemplate.from_messages([
-    ("system", "你是一个 {language} 专家，只输出代码，不要解释，代码要有注释。"),
-    ("human", "写一个函数：{task}"),
+    ("system", "你是一个编程专家，只输出代码，不要解释，代码要有注释。"),
+    ("human", "用 {language} 写一个函数：{task}"),
 ])
 
 # 用 | 把模板和模型串起来，形成一个 chain
 # chain 的调用方式和单独调用模型一样，但内部自动完成"填充模板→发给模型"
 chain = code_template | model
 
-# 直接传变量字典调用
-result = chain.invoke({
-    "language": "Python",
-    "task": "判断一个数是否为质数",
-})
+# 传变量字典调用；换个语言，复用同一个 chain
+# 两次调用互不依赖，用 batch() 一次提交，内部用线程池并发发出两个请求，
+# 总耗时约等于一次调用，而不是两次相加
+result, result2 = chain.batch(
+    [
+        {"language": "Python", "task": "判断一个数是否为质数"},
+        {"language": "JavaScript", "task": "计算数组中所有数字的平均值"},
+    ],
+    config={"max_concurrency": 2},
+)
 print("生成的代码：")
 print(result.content)
 print()
 
-# 换个语言，复用同一个 chain
-result2 = chain.invoke({
-    "language": "JavaScript",
-    "task": "计算数组中所有数字的平均值",
-})
 print("JavaScript 版本：")
 print(result2.content)
 print()
@@ -1,12 +1,10 @@
-import os
-import sys
-from langchain_deepseek import ChatDeepSeek
+from _common import model, enable_llm_cache
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser, JsonOutputParser, CommaSeparatedListOutputParser
 from pydantic import BaseModel, Field
 from langchain_core.output_parsers import PydanticOutputParser
-
-sys.stdout.reconfigure(encoding="utf-8")
+from langchain_core.exceptions import OutputParserException
+import orjson
 
 # ============================================================
 # OutputParser 是什么？为什么需要它？
@@ -30,11 +28,10 @@ sys.stdout.reconfigure(encoding="utf-8")
 #   4. PydanticOutputParser     —— JSON 文本 → Pydantic 对象（有类型校验）
 # ============================================================
 
-model = ChatDeepSeek(
-    model="deepseek-chat",
-    api_key=os.environ.get("DEEPSEEK_API_KEY"),
-    temperature=0.7,
-)
+# model 在 _common.py 中统一创建（ChatModel 参数说明见 demo01）
+
+# 开启本地 LLM 缓存：重复运行时相同的请求直接读本地文件（说明见 _common.py）
+enable_llm_cache()
 
 
 # ============================================================
@@ -83,22 +80,23 @@ list_parser = CommaSeparatedListOutputParser()
 
 # get_format_instructions() 生成一段说明文字，告诉模型应该用什么格式输出
 # 直接塞到提示词里，引导模型按格式回答
-format_instructions = list_parser.get_format_instructions()
+# 这段文字对同一个 Parser 永远不变，生成一次存成常量即可
+LIST_FORMAT_INSTRUCTIONS = list_parser.get_format_instructions()
 print("格式说明（会插入提示词）：")
-print(format_instructions)
+print(LIST_FORMAT_INSTRUCTIONS)
 print()
 
+# partial() 把格式要求提前填进模板，之后 invoke 只需要传真正变化的变量
 list_prompt = ChatPromptTemplate.from_messages([
     ("system", "你是一个{domain}领域的专家。"),
     ("human", "列举5个{topic}，{instructions}"),
-])
+]).partial(instructions=LIST_FORMAT_INSTRUCTIONS)
 
 list_chain = list_prompt | model | list_parser
 
 result_list = list_chain.invoke({
     "domain": "编程",
     "topic": "Python 常用的内置函数",
-    "instructions": format_instructions,    # 把格式要求插入提示词
 })
 
 print(f"返回类型：{type(result_list)}")     # <class 'list'>
@@ -118,7 +116,22 @@ print("=" * 55)
 print("Part 3：JsonOutputParser（文本 → 字典）")
 print("=" * 55)
 
-json_parser = JsonOutputParser()
+# 自定义一个 JsonOutputParser 子类：解析时用 orjson 代替标准库 json。
+# orjson 是 C/Rust 实现的 JSON 库，比 json.loads 快好几倍，输出越大差距越明显。
+# 模型经常把 JSON 包在 ```json ... ``` 代码块里，先去掉这层再解析。
+class FastJsonOutputParser(JsonOutputParser):
+    def parse_result(self, result, *, partial=False):
+        # 流式输出时拿到的是不完整的 JSON，交给父类的容错解析处理
+        if partial:
+            return super().parse_result(result, partial=True)
+        text = result[0].text.strip()
+        text = text.removeprefix("```json").removeprefix("```").removesuffix("```").strip()
+        try:
+            return orjson.loads(text)
+        except orjson.JSONDecodeError as e:
+            raise OutputParserException(f"Invalid json output: {text}", llm_output=text) from e
+
+json_parser = FastJsonOutputParser()
 
 json_prompt = ChatPromptTemplate.from_messages([
     ("system", "你是一个数据提取助手，只返回 JSON 格式，不要有任何多余文字。"),
@@ -165,22 +178,21 @@ class MovieReview(BaseModel):
 pydantic_parser = PydanticOutputParser(pydantic_object=MovieReview)
 
 # get_format_instructions() 会根据你的类结构，自动生成详细的格式要求
-format_instructions = pydantic_parser.get_format_instructions()
+# 生成时要遍历整个 Pydantic 结构再序列化成 JSON Schema，只做一次
+MOVIE_FORMAT_INSTRUCTIONS = pydantic_parser.get_format_instructions()
 print("自动生成的格式说明（前200字）：")
-print(format_instructions[:200] + "...")
+print(MOVIE_FORMAT_INSTRUCTIONS[:200] + "...")
 print()
 
+# 用 partial() 把格式说明固定进模板：评价多部电影时也不用每次重新传
 pydantic_prompt = ChatPromptTemplate.from_messages([
     ("system", "你是一个专业的电影评论家。"),
     ("human", "请评价电影《{movie}》\n\n{format_instructions}"),
-])
+]).partial(format_instructions=MOVIE_FORMAT_INSTRUCTIONS)
 
 pydantic_chain = pydantic_prompt | model | pydantic_parser
 
-result_obj = pydantic_chain.invoke({
-    "movie": "泰坦尼克号",
-    "format_instructions": format_instructions,
-})
+result_obj = pydantic_chain.invoke({"movie": "泰坦尼克号"})
 
 print(f"返回类型：{type(result_obj)}")          # <class 'MovieReview'>
 print(f"电影名：{result_obj.title}")
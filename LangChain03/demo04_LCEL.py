@@ -1,8 +1,5 @@
-import os
-import sys
-from langchain_deepseek import ChatDeepSeek
+from _common import model, parser, enable_llm_cache, run_async
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.output_parsers import StrOutputParser
 from langchain_core.runnables import (
     RunnablePassthrough,    # 把输入原样传递
     RunnableLambda,         # 把普通 Python 函数包装成可以接入管道的组件
@@ -10,8 +7,6 @@ from langchain_core.runnables import (
     RunnableBranch,         # 条件分支路由
 )
 
-sys.stdout.reconfigure(encoding="utf-8")
-
 # ============================================================
 # LCEL 是什么？（LangChain Expression Language）
 #
@@ -40,12 +35,10 @@ sys.stdout.reconfigure(encoding="utf-8")
 #   - RunnableBranch        条件路由
 # ============================================================
 
-model = ChatDeepSeek(
-    model="deepseek-chat",
-    api_key=os.environ.get("DEEPSEEK_API_KEY"),
-    temperature=0.7,
-)
-parser = StrOutputParser()
+# model、parser 在 _common.py 中统一创建（ChatModel 参数说明见 demo01）
+
+# 开启本地 LLM 缓存：重复运行时相同的请求直接读本地文件（说明见 _common.py）
+enable_llm_cache()
 
 
 # ============================================================
@@ -130,13 +123,19 @@ def log_output(text: str) -> str:
     return text  # 必须返回数据，让管道继续
 
 # 用 RunnableLambda 包装函数，接入管道
+#
+# 也可以写成三段：| RunnableLambda(log_output) | RunnableLambda(add_prefix) | RunnableLambda(count_chars)
+# 但管道里每多一个 Runnable，就多一轮回调/追踪的开销。
+# 这三个函数都是纯 Python 的小处理，先在函数里组合好，再包成一个 RunnableLambda。
+def postprocess(text: str) -> str:
+    """先记录日志，再加前缀，最后统计字数"""
+    return count_chars(add_prefix(log_output(text)))
+
 lambda_chain = (
     prompt
     | model
     | parser
-    | RunnableLambda(log_output)     # 先记录日志
-    | RunnableLambda(add_prefix)     # 再加前缀
-    | RunnableLambda(count_chars)    # 最后统计字数
+    | RunnableLambda(postprocess)
 )
 
 result = lambda_chain.invoke({"input": "列举三种排序算法"})
@@ -178,8 +177,16 @@ parallel_explain = RunnableParallel({
     "比喻版": prompt_example | model | parser,
 })
 
+# 用异步接口 ainvoke 调用：
+#   同步的 invoke 会为每个分支开一个线程，各自阻塞等待 HTTP 响应；
+#   ainvoke 则在同一个事件循环里用 asyncio.gather 并发三个协程，
+#   不占额外线程，总耗时约等于最慢的那个分支。
+async def explain_all(topic: str) -> dict:
+    return await parallel_explain.ainvoke({"topic": topic})
+
 print("同时从三个角度解释「变量」：")
-results = parallel_explain.invoke({"topic": "变量"})
+# run_async 在 _common.py 共用的事件循环里运行（装了 uvloop 就用 uvloop），用法同 asyncio.run
+results = run_async(explain_all("变量"))
 for key, value in results.items():
     print(f"\n【{key}】")
     print(value)
@@ -229,17 +236,22 @@ question = "黑洞是什么？"
 
 print(f"问题：{question}\n")
 
-print("[正式风格]")
-print(branch_chain.invoke({"question": question, "style": "formal"}))
-print()
-
-print("[口语风格]")
-print(branch_chain.invoke({"question": question, "style": "casual"}))
-print()
+# 三种风格互不依赖，用 batch() 一次提交，三个请求并发发出
+# 每个输入仍然各自经过 RunnableBranch 路由到对应的链
+styles = [
+    ("formal", "正式风格"),
+    ("casual", "口语风格"),
+    ("other", "默认（简单）风格"),
+]
+branch_results = branch_chain.batch(
+    [{"question": question, "style": style} for style, _ in styles],
+    config={"max_concurrency": 3},
+)
 
-print("[默认（简单）风格]")
-print(branch_chain.invoke({"question": question, "style": "other"}))
-print()
+for (_, label), answer in zip(styles, branch_results):
+    print(f"[{label}]")
+    print(answer)
+    print()
 
 
 # ============================================================
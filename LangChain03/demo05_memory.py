@@ -1,13 +1,12 @@
 import os
-import sys
-from langchain_deepseek import ChatDeepSeek
+from collections import OrderedDict, deque
+from _common import model, enable_llm_cache
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
 from langchain_core.chat_history import InMemoryChatMessageHistory
 from langchain_core.runnables.history import RunnableWithMessageHistory
-
-sys.stdout.reconfigure(encoding="utf-8")
+from langchain_core.globals import set_llm_cache
 
 # ============================================================
 # 为什么需要 Memory（对话记忆）？
@@ -31,11 +30,43 @@ sys.stdout.reconfigure(encoding="utf-8")
 #   3. 摘要记忆   —— 用模型对历史做摘要，压缩后保留（节省 token）
 # ============================================================
 
-model = ChatDeepSeek(
-    model="deepseek-chat",
-    api_key=os.environ.get("DEEPSEEK_API_KEY"),
-    temperature=0.7,
-)
+# model 在 _common.py 中统一创建（ChatModel 参数说明见 demo01）
+
+# LLM 缓存：默认开启本地 SQLite 缓存，重复运行时相同的请求直接读本地文件（说明见 _common.py）
+# 注意只有 invoke() / batch() 会查缓存。本文件里只有 Part 1 的 batch() 走缓存；
+# Part 2~4 为了边生成边打印用的是 stream()，每次都会真正请求模型。
+#
+# 语义缓存（可选）：
+# SQLite 缓存要求提示词一字不差，改写过的同义问题不会命中。
+# 设置环境变量 REDIS_URL 后改用 RedisSemanticCache：先在本地把提示词转成向量（约 5 毫秒），
+# 与缓存里的提示词向量距离小于 0.05（相似度约 0.95）就直接返回旧回答，省掉一次约 2 秒的模型调用。
+# 例如把 Part 1 的 "我叫什么名字？" 改成 "我的名字是什么？" 再运行，仍会命中上次的回答。
+# 同样只对 Part 1 生效。
+# 需要额外安装：pip install redis sentence-transformers，并启动一个 Redis 服务。
+REDIS_URL = os.environ.get("REDIS_URL")
+if REDIS_URL:
+    from langchain_community.cache import RedisSemanticCache
+    from langchain_community.embeddings import HuggingFaceEmbeddings
+
+    set_llm_cache(RedisSemanticCache(
+        redis_url=REDIS_URL,
+        embedding=HuggingFaceEmbeddings(model_name="BAAI/bge-small-zh-v1.5"),
+        score_threshold=0.05,
+    ))
+else:
+    enable_llm_cache()
+
+# 流式输出：
+# invoke() 要等模型把整段回复生成完才返回，用户盯着空白屏幕等 1~3 秒；
+# stream() 收到第一个 token 就开始打印，体感延迟降到首 token 的时间。
+def print_stream(chunks) -> str:
+    """逐块打印流式输出的文本，同时拼接成完整回复返回（存入历史要用）"""
+    parts = []
+    for text in chunks:
+        print(text, end="", flush=True)
+        parts.append(text)
+    print()
+    return "".join(parts)
 
 
 # ============================================================
@@ -53,12 +84,16 @@ no_memory_chain = (
     | StrOutputParser()
 )
 
+# 没有记忆时，两次调用本来就互不相干，用 batch() 一起并发发出，省一次等待
+r1, r2 = no_memory_chain.batch([
+    {"input": "我叫小明，我在学 Python"},
+    {"input": "我叫什么名字？"},
+])
+
 print("用户：我叫小明，我在学 Python")
-r1 = no_memory_chain.invoke({"input": "我叫小明，我在学 Python"})
 print(f"助手：{r1}\n")
 
 print("用户：我叫什么名字？")
-r2 = no_memory_chain.invoke({"input": "我叫什么名字？"})
 print(f"助手：{r2}")
 print("（模型不记得了！每次都是全新对话）")
 print()
@@ -72,9 +107,13 @@ print()
 #
 # 优点：简单直观，完全自己控制
 # 缺点：对话越长，发送的 token 越多；需要自己管理列表
+#
+# 每轮都重发全部历史，N 轮对话累计发送的 token 是 O(N²)。
+# 这里加一道保险：列表里仍保存完整历史，但发给模型的只有
+# 系统提示 + 最近 MAX_SENT_TURNS 轮。短对话完全不受影响。
 # ============================================================
 print("=" * 55)
-print("Part 2：手动维护消息列表（全量记忆）")
+print("Part 2：手动维护消息列表（保存全部历史，只发最近 N 轮）")
 print("=" * 55)
 
 # 初始化历史，放系统提示
@@ -82,27 +121,33 @@ chat_history = [
     SystemMessage(content="你是一个友好的编程助手，记住用户说过的信息。"),
 ]
 
+MAX_SENT_TURNS = 10  # 每次最多带上最近 10 轮（20 条消息）
+
 def chat_with_memory(user_input: str) -> str:
     """带记忆的对话函数"""
     # 把用户消息加入历史
     chat_history.append(HumanMessage(content=user_input))
-    # 把完整历史发给模型
-    response = model.invoke(chat_history)
+    # 系统提示 + 最近 MAX_SENT_TURNS 轮发给模型
+    # 最后一条是本轮的 HumanMessage，所以取 2*N-1 条正好是 N-1 轮完整对话 + 本轮提问
+    recent = chat_history[1:][-(MAX_SENT_TURNS * 2 - 1):]
+    # 边生成边打印，model.stream() 返回的每一块是 AIMessageChunk
+    print("助手：", end="", flush=True)
+    reply = print_stream(c.content for c in model.stream([chat_history[0], *recent]))
     # 把模型回复也存入历史（下一轮需要带上）
-    chat_history.append(AIMessage(content=response.content))
-    return response.content
+    chat_history.append(AIMessage(content=reply))
+    return reply
 
 print("用户：我叫小红，最近在学 LangChain")
-r1 = chat_with_memory("我叫小红，最近在学 LangChain")
-print(f"助手：{r1}\n")
+chat_with_memory("我叫小红，最近在学 LangChain")
+print()
 
 print("用户：我在学什么？")
-r2 = chat_with_memory("我在学什么？")
-print(f"助手：{r2}\n")
+chat_with_memory("我在学什么？")
+print()
 
 print("用户：我叫什么名字？")
-r3 = chat_with_memory("我叫什么名字？")
-print(f"助手：{r3}\n")
+chat_with_memory("我叫什么名字？")
+print()
 
 print(f"当前历史消息数：{len(chat_history)} 条")
 print()
@@ -126,20 +171,42 @@ print("=" * 55)
 
 # 用字典模拟"数据库"，key 是 session_id，value 是该用户的历史
 # 真实项目中这里可以换成 Redis、数据库等持久化存储
-session_store = {}
+#
+# 普通 dict 只增不减：每来一个新 session_id 就多一份历史，永远不释放。
+# 这里用 OrderedDict 做一个有上限的 LRU：
+#   - 最多保留 MAX_SESSIONS 个会话，超出时丢掉最久没说话的那个
+#   - 每个会话最多保留最近 MAX_HISTORY_MESSAGES 条消息
+MAX_SESSIONS = 1024
+MAX_HISTORY_MESSAGES = 20   # 最近 10 轮（10 Human + 10 AI）
+
+session_store = OrderedDict()
 
 def get_session_history(session_id: str) -> InMemoryChatMessageHistory:
     """
     根据 session_id 获取（或创建）对话历史。
     RunnableWithMessageHistory 每次调用时会自动调用这个函数。
     """
-    if session_id not in session_store:
+    if session_id in session_store:
+        # 标记为最近使用，挪到队尾
+        session_store.move_to_end(session_id)
+    else:
         # 第一次对话，创建新的历史记录
         session_store[session_id] = InMemoryChatMessageHistory()
-    return session_store[session_id]
+        if len(session_store) > MAX_SESSIONS:
+            session_store.popitem(last=False)   # 淘汰最久未使用的会话
+
+    history = session_store[session_id]
+    if len(history.messages) > MAX_HISTORY_MESSAGES:
+        history.messages = history.messages[-MAX_HISTORY_MESSAGES:]
+    return history
 
 # 定义带 MessagesPlaceholder 的提示词模板
 # MessagesPlaceholder 是历史消息的占位符，历史会自动填入这里
+#
+# 顺序很重要：固定的 system → 逐轮增长的 history → 本轮 input。
+# 每一轮请求的开头都和上一轮完全相同，DeepSeek 会自动命中前缀缓存，
+# 重复部分的输入 token 按缓存价格计费，首 token 也返回得更快。
+# 所以 system 里不要放时间戳、随机数等每次都变的内容。
 prompt_with_history = ChatPromptTemplate.from_messages([
     ("system", "你是一个友好的编程助手，会记住用户说的信息。"),
     MessagesPlaceholder(variable_name="history"),  # 历史消息插入这里
@@ -162,23 +229,31 @@ chain_with_memory = RunnableWithMessageHistory(
 config_user_a = {"configurable": {"session_id": "user_A"}}
 config_user_b = {"configurable": {"session_id": "user_B"}}
 
+def chat_in_session(user_input: str, config: dict) -> str:
+    """
+    流式调用带记忆的 chain。
+    chain 末尾是 StrOutputParser，stream() 直接吐出字符串片段；
+    流结束后 RunnableWithMessageHistory 会把完整的一轮写回历史。
+    """
+    print("助手：", end="", flush=True)
+    return print_stream(chain_with_memory.stream({"input": user_input}, config=config))
+
 print("--- 用户A 的对话 ---")
 print("用户A：我是小强，我在做一个电商项目")
-r = chain_with_memory.invoke({"input": "我是小强，我在做一个电商项目"}, config=config_user_a)
-print(f"助手：{r}\n")
+chat_in_session("我是小强，我在做一个电商项目", config_user_a)
+print()
 
 print("用户A：我的项目是做什么的？")
-r = chain_with_memory.invoke({"input": "我的项目是做什么的？"}, config=config_user_a)
-print(f"助手：{r}\n")
+chat_in_session("我的项目是做什么的？", config_user_a)
+print()
 
 print("--- 用户B 的对话（和用户A 完全隔离）---")
 print("用户B：我叫小李")
-r = chain_with_memory.invoke({"input": "我叫小李"}, config=config_user_b)
-print(f"助手：{r}\n")
+chat_in_session("我叫小李", config_user_b)
+print()
 
 print("用户B：你知道小强是谁吗？")
-r = chain_with_memory.invoke({"input": "你知道小强是谁吗？"}, config=config_user_b)
-print(f"助手：{r}")
+chat_in_session("你知道小强是谁吗？", config_user_b)
 print("（用户B 看不到用户A 的历史）\n")
 
 # 查看历史存储情况
@@ -202,23 +277,28 @@ print("=" * 55)
 
 WINDOW_SIZE = 2  # 只保留最近 2 轮对话（4 条消息：2 Human + 2 AI）
 
-window_history = []
+# deque 设置 maxlen 后，满了再 append 会自动从左边挤掉最老的元素，O(1)；
+# list.pop(0) 则要把后面的元素整体前移一位，是 O(N)
+window_history = deque(maxlen=WINDOW_SIZE * 2)
+
+# 系统提示每轮都一样，创建一次反复使用，不用每次调用都新建一个 SystemMessage
+WINDOW_SYSTEM_MESSAGE = SystemMessage(content="你是一个助手。")
 
 def chat_with_window(user_input: str) -> str:
     """只保留最近 N 轮的对话函数"""
-    window_history.append(HumanMessage(content=user_input))
-    response = model.invoke([
-        SystemMessage(content="你是一个助手。"),
-        *window_history,    # 展开当前窗口内的历史
-    ])
-    window_history.append(AIMessage(content=response.content))
+    user_message = HumanMessage(content=user_input)
+    print("助手：", end="", flush=True)
+    reply = print_stream(c.content for c in model.stream([
+        WINDOW_SYSTEM_MESSAGE,
+        *window_history,    # 展开当前窗口内的历史（最近 N 轮）
+        user_message,       # 本轮提问
+    ]))
 
-    # 超出窗口大小就删掉最老的一轮（2条：1 Human + 1 AI）
-    if len(window_history) > WINDOW_SIZE * 2:
-        window_history.pop(0)   # 删最老的 HumanMessage
-        window_history.pop(0)   # 删最老的 AIMessage
+    # 拿到回复后再把这一轮（1 Human + 1 AI）一起存进窗口，
+    # 超出 maxlen 时 deque 自动挤掉最老的一轮，不用手动删
+    window_history.extend([user_message, AIMessage(content=reply)])
 
-    return response.content
+    return reply
 
 turns = [
     "第一轮：我在学 Python",
@@ -229,8 +309,7 @@ turns = [
 
 for msg in turns:
     print(f"用户：{msg}")
-    reply = chat_with_window(msg)
-    print(f"助手：{reply}")
+    chat_with_window(msg)
     print(f"（当前窗口消息数：{len(window_history)}）\n")
 
 
@@ -238,8 +317,8 @@ print("=" * 55)
 print("总结：三种记忆策略对比")
 print("=" * 55)
 print("""
-全量记忆（Part 2/3）：
-  原理：保留所有历史消息
+全量记忆（Part 2/3 的基础做法，两者都加了上限）：
+  原理：保留所有历史消息，每轮全部发给模型
   优点：什么都记得
   缺点：对话越长 token 越多，成本越高
   适合：短对话、对记忆完整性要求高的场景
@@ -32,13 +32,17 @@ sys.stdout.reconfigure(encoding="utf-8")
 
 # ============================================================
 # 先创建一些示例文件，用于后面的加载演示
+#
+# 文件内容固定不变，只在第一次运行时创建，之后直接复用，
+# 不再每次运行都重写、再删除。
 # ============================================================
 DEMO_DIR = os.path.dirname(os.path.abspath(__file__))
 
 # 创建示例 txt 文件
 txt_path = os.path.join(DEMO_DIR, "sample.txt")
-with open(txt_path, "w", encoding="utf-8") as f:
-    f.write("""LangChain 是什么？
+if not os.path.exists(txt_path):
+    with open(txt_path, "w", encoding="utf-8", buffering=65536) as f:
+        f.write("""LangChain 是什么？
 
 LangChain 是一个用于开发大语言模型应用的开源框架，由 Harrison Chase 于 2022 年创建。
 它提供了一套标准化的工具和接口，帮助开发者更轻松地构建基于 LLM 的应用程序。
@@ -58,15 +62,17 @@ LangChain 在 2024 年进行了大规模重构，推出了 LCEL（LangChain Expr
 用管道符 | 取代了老版本的 Chain 类，使代码更加简洁和直观。
 """)
 
-# 创建示例 CSV 文件
+# 创建示例 CSV 文件（writerows 一次写入全部行）
 csv_path = os.path.join(DEMO_DIR, "sample.csv")
-with open(csv_path, "w", encoding="utf-8", newline="") as f:
-    writer = csv.writer(f)
-    writer.writerow(["姓名", "职位", "技能", "年限"])
-    writer.writerow(["张三", "后端工程师", "Python, Django, PostgreSQL", "5"])
-    writer.writerow(["李四", "前端工程师", "React, TypeScript, CSS", "3"])
-    writer.writerow(["王五", "AI工程师", "LangChain, PyTorch, RAG", "2"])
-    writer.writerow(["赵六", "全栈工程师", "Vue, FastAPI, Docker", "4"])
+if not os.path.exists(csv_path):
+    with open(csv_path, "w", encoding="utf-8", newline="") as f:
+        csv.writer(f).writerows([
+            ["姓名", "职位", "技能", "年限"],
+            ["张三", "后端工程师", "Python, Django, PostgreSQL", "5"],
+            ["李四", "前端工程师", "React, TypeScript, CSS", "3"],
+            ["王五", "AI工程师", "LangChain, PyTorch, RAG", "2"],
+            ["赵六", "全栈工程师", "Vue, FastAPI, Docker", "4"],
+        ])
 
 
 # ============================================================
@@ -159,7 +165,10 @@ from langchain_community.document_loaders import WebBaseLoader
 url = "https://python.langchain.com/docs/introduction/"
 print(f"正在加载网页：{url}")
 
-web_loader = WebBaseLoader(url)
+web_loader = WebBaseLoader(
+    url,
+    requests_kwargs={"timeout": 10},   # 最多等 10 秒，网络不通时不会一直卡住
+)
 try:
     web_docs = web_loader.load()
     print(f"加载成功！共 {len(web_docs)} 个 Document")
@@ -241,12 +250,6 @@ for i, chunk in enumerate(text_chunks):
 print()
 
 
-# ============================================================
-# 清理示例文件
-# ============================================================
-os.remove(txt_path)
-os.remove(csv_path)
-
 print("=" * 55)
 print("总结：Data Connection 完整流程")
 print("=" * 55)
@@ -1,9 +1,9 @@
-import os
-import sys
 import json
 import datetime
-
-sys.stdout.reconfigure(encoding="utf-8")
+import ast
+import functools
+import asyncio
+from typing import NamedTuple
 
 # ============================================================
 # ReAct 是什么？
@@ -46,16 +46,15 @@ sys.stdout.reconfigure(encoding="utf-8")
 #   → 回答："需要带伞"
 # ============================================================
 
-from langchain_deepseek import ChatDeepSeek
+from _common import get_model, run_async
 from langchain_core.tools import tool
 from langchain.agents import create_react_agent, AgentExecutor
 from langchain_core.prompts import PromptTemplate
+from langchain_core.messages import HumanMessage, ToolMessage
 
-model = ChatDeepSeek(
-    model="deepseek-chat",
-    api_key=os.environ.get("DEEPSEEK_API_KEY"),
-    temperature=0,      # Agent 场景推荐设为 0，让模型更稳定、确定性更强
-)
+# Agent 场景推荐 temperature=0，让模型更稳定、确定性更强
+# get_model 按参数缓存实例，并与其他 demo 共用同一个 HTTP 连接池（见 _common.py）
+model = get_model(temperature=0)
 
 
 # ============================================================
@@ -69,6 +68,34 @@ model = ChatDeepSeek(
 #   - 函数返回值    → Observation（工具执行结果）
 # ============================================================
 
+# 工具用到的模拟数据放在模块级，只在加载时构建一次，
+# 每次工具调用只做一次字典查找，不用重新创建整张表。
+
+# 模拟天气数据（真实场景中调用天气 API）
+_WEATHER_DATA = {
+    "北京": "晴，气温 -2°C 到 8°C，西北风 3 级，不需要带伞",
+    "上海": "小雨，气温 5°C 到 12°C，东南风 2 级，需要带伞",
+    "广州": "多云，气温 15°C 到 22°C，南风 1 级，不需要带伞",
+    "成都": "阴，气温 6°C 到 14°C，无持续风向，可能有小雨建议带伞",
+}
+
+
+class EmployeeInfo(NamedTuple):
+    position: str     # 职位
+    department: str   # 部门
+    email: str        # 邮箱
+
+
+# 模拟员工数据库
+_EMPLOYEES = {
+    "张三": EmployeeInfo("后端工程师", "技术部", "zhangsan@company.com"),
+    "李四": EmployeeInfo("产品经理", "产品部", "lisi@company.com"),
+    "王五": EmployeeInfo("AI工程师", "技术部", "wangwu@company.com"),
+}
+
+_WEEKDAYS = ("星期一", "星期二", "星期三", "星期四", "星期五", "星期六", "星期日")
+
+
 @tool
 def get_weather(city: str) -> str:
     """
@@ -76,14 +103,31 @@ def get_weather(city: str) -> str:
     当用户询问某个城市的天气、温度、是否需要带伞时使用此工具。
     输入：城市名称，例如：北京、上海、广州
     """
-    # 模拟天气数据（真实场景中调用天气 API）
-    weather_data = {
-        "北京": "晴，气温 -2°C 到 8°C，西北风 3 级，不需要带伞",
-        "上海": "小雨，气温 5°C 到 12°C，东南风 2 级，需要带伞",
-        "广州": "多云，气温 15°C 到 22°C，南风 1 级，不需要带伞",
-        "成都": "阴，气温 6°C 到 14°C，无持续风向，可能有小雨建议带伞",
-    }
-    return weather_data.get(city, f"暂无 {city} 的天气数据，请尝试其他城市")
+    return _WEATHER_DATA.get(city, f"暂无 {city} 的天气数据，请尝试其他城市")
+
+
+# calculate 工具允许出现的语法节点：数字、括号、加减乘除（含整除、取余）和正负号。
+# 乘方（**）不在其中：9**9**9 这种表达式能把 CPU 和内存耗尽。
+_CALC_ALLOWED_NODES = (
+    ast.Expression, ast.BinOp, ast.UnaryOp, ast.Constant,
+    ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod,
+    ast.UAdd, ast.USub,
+)
+
+
+@functools.lru_cache(maxsize=512)
+def _compile_expression(expression: str):
+    """
+    把表达式解析成语法树，逐个节点检查是否在白名单内，再编译成字节码。
+    结果按表达式字符串缓存，同一个表达式第二次计算时不用再解析和编译。
+    """
+    tree = ast.parse(expression.strip(), mode="eval")
+    for node in ast.walk(tree):
+        if not isinstance(node, _CALC_ALLOWED_NODES):
+            raise ValueError(f"不支持的语法：{type(node).__name__}，只支持基本数学运算")
+        if isinstance(node, ast.Constant) and not isinstance(node.value, (int, float)):
+            raise ValueError("表达式里只能出现数字")
+    return compile(tree, "<calculate>", "eval")
 
 
 @tool
@@ -94,11 +138,8 @@ def calculate(expression: str) -> str:
     输入：合法的数学表达式字符串，例如：'3 * (4 + 5)' 或 '100 / 4 + 28'
     """
     try:
-        # 只允许数字和基本运算符，防止代码注入
-        allowed = set("0123456789+-*/(). ")
-        if not all(c in allowed for c in expression):
-            return "表达式包含非法字符，只支持基本数学运算"
-        result = eval(expression)
+        # 语法树已经过白名单检查，执行时再去掉所有内置函数，防止代码注入
+        result = eval(_compile_expression(expression), {"__builtins__": {}}, {})
         return f"{expression} = {result}"
     except Exception as e:
         return f"计算失败：{e}"
@@ -112,8 +153,7 @@ def get_current_time(timezone: str = "Asia/Shanghai") -> str:
     输入：时区名称，默认为 Asia/Shanghai（北京时间）
     """
     now = datetime.datetime.now()
-    weekdays = ["星期一", "星期二", "星期三", "星期四", "星期五", "星期六", "星期日"]
-    weekday = weekdays[now.weekday()]
+    weekday = _WEEKDAYS[now.weekday()]
     return f"当前时间：{now.strftime('%Y年%m月%d日 %H:%M:%S')}，{weekday}"
 
 
@@ -124,28 +164,29 @@ def search_employee(name: str) -> str:
     当用户询问某位员工的职位、部门、联系方式时使用此工具。
     输入：员工姓名
     """
-    # 模拟员工数据库
-    employees = {
-        "张三": {"职位": "后端工程师", "部门": "技术部", "邮箱": "zhangsan@company.com"},
-        "李四": {"职位": "产品经理", "部门": "产品部", "邮箱": "lisi@company.com"},
-        "王五": {"职位": "AI工程师", "部门": "技术部", "邮箱": "wangwu@company.com"},
-    }
-    if name in employees:
-        info = employees[name]
-        return f"{name} 的信息：职位={info['职位']}，部门={info['部门']}，邮箱={info['邮箱']}"
-    return f"未找到员工：{name}"
+    info = _EMPLOYEES.get(name)
+    if info is None:
+        return f"未找到员工：{name}"
+    return f"{name} 的信息：职位={info.position}，部门={info.department}，邮箱={info.email}"
 
 
 # 把所有工具放到列表里
 tools = [get_weather, calculate, get_current_time, search_employee]
 
+# 按名称查工具用字典，O(1) 命中（Part 5 自己分发工具调用时用）。
+# AgentExecutor 内部也是这样做的：每次运行前把 tools 转成 {name: tool}。
+TOOL_BY_NAME = {t.name: t for t in tools}
+
+# 工具说明的预览只需要截取一次
+TOOL_DESC_PREVIEW = tuple((t.name, t.description[:50]) for t in tools)
+
 # 查看工具的名称和描述（模型会读这些来决定用哪个工具）
 print("=" * 55)
 print("已注册的工具列表：")
 print("=" * 55)
-for t in tools:
-    print(f"  工具名：{t.name}")
-    print(f"  描述：{t.description[:50]}...")
+for name, desc in TOOL_DESC_PREVIEW:
+    print(f"  工具名：{name}")
+    print(f"  描述：{desc}...")
     print()
 
 
@@ -203,7 +244,10 @@ agent = create_react_agent(
 executor = AgentExecutor(
     agent=agent,
     tools=tools,
-    verbose=True,           # 打印完整的推理过程（Thought/Action/Observation）
+    # 下面几个示例问题是并发运行的，verbose=True 时各自的推理过程会交错打印。
+    # 改为在结果里带回中间步骤，等全部跑完再按问题顺序逐个打印。
+    verbose=False,
+    return_intermediate_steps=True,  # 结果中附带每一步的 (Action, Observation)
     max_iterations=5,       # 最多循环 5 次，防止无限循环
     handle_parsing_errors=True,  # 模型输出格式不对时自动处理，不直接报错
 )
@@ -213,23 +257,102 @@ executor = AgentExecutor(
 # Part 4：运行 Agent，观察 ReAct 推理过程
 # ============================================================
 
-def run_agent(question: str):
+async def run_agent(question: str) -> dict:
+    # ainvoke：等待 DeepSeek 响应时让出事件循环，其他问题的请求可以同时进行
+    return await executor.ainvoke({"input": question})
+
+
+async def run_all(questions: list[str]) -> list[dict]:
+    # gather 按传入顺序返回结果，打印顺序与 questions 一致
+    return await asyncio.gather(*(run_agent(q) for q in questions))
+
+
+def print_result(question: str, result: dict):
+    """打印一个问题完整的 ReAct 推理过程和最终答案"""
     print("\n" + "=" * 55)
     print(f"用户问题：{question}")
     print("=" * 55)
-    result = executor.invoke({"input": question})
-    print(f"\n最终答案：{result['output']}")
+    for action, observation in result["intermediate_steps"]:
+        print(action.log.strip())                 # Thought + Action + Action Input
+        print(f"Observation: {observation}\n")
+    print(f"最终答案：{result['output']}")
     print()
 
 
-# 示例 1：单工具调用
-run_agent("上海今天需要带伞吗？")
+questions = [
+    "上海今天需要带伞吗？",                                     # 示例 1：单工具调用
+    "我买了3件衣服，分别是128元、256元和99元，一共花了多少钱？",  # 示例 2：数学计算
+    "王五在哪个部门工作？他所在城市（上海）今天天气怎么样？",      # 示例 3：需要多步推理（先查人，再查天气）
+    "Python 和 JavaScript 各自适合做什么？",                     # 示例 4：无需工具，直接回答
+]
+
+# 四个问题互不相干，每个 Agent 循环的大部分时间都在等 DeepSeek 的 HTTP 响应。
+# 用 asyncio 在一个事件循环里同时跑，不需要为每个问题开线程，
+# 总耗时从四个问题耗时之和降到最慢的那一个。
+# 工具都是普通同步函数，AgentExecutor 异步执行时会自动放到线程池里调用。
+results = run_async(run_all(questions))
+
+for question, result in zip(questions, results):
+    print_result(question, result)
+
+
+# ============================================================
+# Part 5：并行工具调用（Tool Calling）
+#
+# 文本版 ReAct 每一轮只能写一个 Action，
+# 像示例 3 这样"查王五的部门"和"查上海天气"两件互不依赖的事，
+# 也得排队：Thought → Action → Observation → Thought → Action → ...
+#
+# 支持 Function Calling 的模型（DeepSeek 也支持）可以在一次回复里
+# 同时给出多个 tool_calls。它们在同一轮出现，说明彼此不依赖对方的结果，
+# 可以用 asyncio.gather 同时执行；依赖前面结果的调用，模型会放到下一轮再发。
+#
+# 这样多工具问题的耗时从"各工具耗时之和"降到"最慢的那个工具"，
+# 与模型的往返次数也更少。
+# ============================================================
+print("=" * 55)
+print("Part 5：并行工具调用")
+print("=" * 55)
+
+# bind_tools 把工具的名称、说明、参数结构以 JSON Schema 的形式交给模型
+model_with_tools = model.bind_tools(tools)
+
+
+async def run_tool_call(call: dict) -> str:
+    """执行模型发起的一次工具调用；工具名不存在时返回错误说明，而不是抛异常"""
+    # 模型偶尔会编造不存在的工具名。这里把错误当作 Observation 交还给模型，
+    # 它看到可用工具列表后通常会改正；直接抛 KeyError 会让整轮 gather 失败
+    tool = TOOL_BY_NAME.get(call["name"])
+    if tool is None:
+        return f"未知工具：{call['name']}，可用的工具有：{', '.join(TOOL_BY_NAME)}"
+    return await tool.ainvoke(call["args"])
+
+
+async def run_parallel_tool_agent(question: str, max_rounds: int = 5) -> str:
+    messages = [HumanMessage(content=question)]
+    for _ in range(max_rounds):
+        ai_msg = await model_with_tools.ainvoke(messages)
+        messages.append(ai_msg)
+
+        # 没有工具调用，说明模型已经给出最终答案
+        if not ai_msg.tool_calls:
+            return ai_msg.content
+
+        # 同一轮的多个工具调用并发执行，结果按 tool_calls 的顺序返回
+        observations = await asyncio.gather(*(
+            run_tool_call(call) for call in ai_msg.tool_calls
+        ))
+        print(f"本轮并发调用了 {len(ai_msg.tool_calls)} 个工具：")
+        for call, observation in zip(ai_msg.tool_calls, observations):
+            print(f"  {call['name']}({call['args']}) → {observation}")
+            # 每个结果用 tool_call_id 对应回模型发起的那次调用
+            messages.append(ToolMessage(content=observation, tool_call_id=call["id"]))
 
-# 示例 2：数学计算
-run_agent("我买了3件衣服，分别是128元、256元和99元，一共花了多少钱？")
+    return f"超过 {max_rounds} 轮仍未得到最终答案"
 
-# 示例 3：需要多步推理（先查人，再查天气）
-run_agent("王五在哪个部门工作？他所在城市（上海）今天天气怎么样？")
 
-# 示例 4：无需工具，直接回答
-run_agent("Python 和 JavaScript 各自适合做什么？")
+question = "王五在哪个部门工作？他所在城市（上海）今天天气怎么样？"
+print(f"用户问题：{question}\n")
+answer = run_async(run_parallel_tool_agent(question))
+print(f"\n最终答案：{answer}")
+print()
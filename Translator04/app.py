@@ -1,43 +1,42 @@
-import os
 import sys
-import gradio as gr
-from pydantic import BaseModel, Field
-from langchain_deepseek import ChatDeepSeek
+from pydantic import BaseModel, Field, ValidationError
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.output_parsers import StrOutputParser, PydanticOutputParser
-from langchain_core.runnables import RunnableLambda
+from langchain_core.output_parsers import StrOutputParser, PydanticOutputParser, JsonOutputParser
+from langchain_core.exceptions import OutputParserException
+
+from llm_factory import get_model, enable_llm_cache
 
 sys.stdout.reconfigure(encoding="utf-8")
 
 # ============================================================
-# 整体设计思路（两条 Chain 串联）
+# 整体设计思路（单次调用为主，两段式兜底）
 #
 # 用户输入："帮我把'人工智能正在改变世界'翻译成日语"
 #
-#   【Chain 1：解析链】
+#   【主路径：单次调用链 one_shot_chain】
 #   用户自然语言输入
-#       ↓ parse_prompt
+#       ↓ one_shot_prompt
 #       ↓ model
-#       ↓ PydanticOutputParser   ← 把输出结构化成 ParseResult 对象
-#   ParseResult(source_text="人工智能正在改变世界", target_language="日语")
+#       ↓ JsonOutputParser       ← 一次输出原文、目标语言和译文，边生成边解析出部分 JSON
+#   TranslateResult(source_text="人工智能正在改变世界", target_language="日语",
+#                   translation="人工知能は世界を変えています")
 #
-#   【Chain 2：翻译链】
-#   ParseResult 对象
-#       ↓ RunnableLambda         ← 把对象转成字典，传给下一个 prompt
-#       ↓ translate_prompt
-#       ↓ model
-#       ↓ StrOutputParser
+#   【兜底：两段式】模型没按格式输出、解析失败时
+#   用户自然语言输入
+#       ↓ parse_chain（解析链）       ← 先提取原文和目标语言
+#   ParseResult(source_text="人工智能正在改变世界", target_language="日语")
+#       ↓ translate_chain（翻译链）   ← 再流式翻译，边翻译边显示
 #   "人工知能は世界を変えています"
-#
-#   完整 Pipeline：
-#   parse_chain | RunnableLambda(转换) | translate_chain
 # ============================================================
 
-model = ChatDeepSeek(
-    model="deepseek-chat",
-    api_key=os.environ.get("DEEPSEEK_API_KEY"),
-    temperature=0,
-)
+# 模型实例来自 llm_factory，同样的参数在进程内只创建一次，HTTP 连接池与 translator_agent 共用
+model = get_model(temperature=0)
+
+# 开启本地 LLM 缓存：同一句话重复提交时直接读本地文件（说明见 llm_factory.py）
+# 只有 invoke() 的调用会查缓存，stream() 不会。这里只有退回两段式时的解析链 parse_chain 用 invoke()；
+# 主路径 one_shot_chain 和兜底的翻译链都用 stream() 边生成边显示，每次都会真正请求模型。
+# 这是有意的取舍：翻译界面上首字出现得快，比重复提交同一句话时省一次请求更重要。
+enable_llm_cache()
 
 
 # ============================================================
@@ -53,7 +52,7 @@ class ParseResult(BaseModel):
 
 
 # ============================================================
-# Chain 1：解析链
+# 兜底 Chain 1：解析链
 #
 # 职责：理解用户的自然语言指令，提取出"原文"和"目标语言"
 # 输入：用户的一句话，例如 "帮我把xxx翻译成英语"
@@ -61,6 +60,8 @@ class ParseResult(BaseModel):
 # ============================================================
 parse_parser = PydanticOutputParser(pydantic_object=ParseResult)
 
+# 格式说明是固定文本，用 partial() 在模块加载时填进模板一次，
+# 之后 invoke 只需要传用户输入，不用每次重新生成 JSON Schema 说明
 parse_prompt = ChatPromptTemplate.from_messages([
     (
         "system",
@@ -72,14 +73,14 @@ parse_prompt = ChatPromptTemplate.from_messages([
         "human",
         "{user_input}"
     ),
-])
+]).partial(format_instructions=parse_parser.get_format_instructions())
 
 # 解析链：提示词 → 模型 → 结构化解析器
 parse_chain = parse_prompt | model | parse_parser
 
 
 # ============================================================
-# Chain 2：翻译链
+# 兜底 Chain 2：翻译链
 #
 # 职责：拿到结构化的原文和目标语言，执行翻译
 # 输入：包含 source_text 和 target_language 的字典
@@ -102,108 +103,164 @@ translate_chain = translate_prompt | model | StrOutputParser()
 
 
 # ============================================================
-# 串联两条 Chain
+# 单次调用版：解析 + 翻译合并成一次请求
+#
+# 上面两条 Chain 先后调用意味着每次翻译都要等两次 DeepSeek 往返。
+# 其实"找出原文和目标语言"和"翻译"可以让模型在一次回答里同时完成：
+# 让它直接输出包含 source_text / target_language / translation 三个字段的 JSON。
+# 请求次数减半，等待时间也差不多减半。
 #
-# parse_chain 输出的是 ParseResult 对象，
-# translate_chain 需要的是字典 {"source_text": ..., "target_language": ...}
+# 模型偶尔没按格式输出时，再退回上面的两段式 Chain。
 #
-# 用 RunnableLambda 做中间转换：ParseResult 对象 → 字典
+# 为什么用 JsonOutputParser 而不是 PydanticOutputParser？
+#   PydanticOutputParser 要等完整的 JSON 生成完才能解析，界面上只能干等。
+#   JsonOutputParser 支持流式：每收到一段就把"目前为止的部分 JSON"解析成字典，
+#   译文字段边生成边变长，界面可以一段一段地刷新。
+#   生成结束后再用 TranslateResult 校验一次完整结果，字段缺失或类型不对就退回两段式。
 # ============================================================
-def parse_result_to_dict(result: ParseResult) -> dict:
-    """把 ParseResult 对象转换成翻译链需要的字典格式"""
-    return {
-        "source_text": result.source_text,
-        "target_language": result.target_language,
-    }
+class TranslateResult(BaseModel):
+    source_text: str = Field(description="用户想要翻译的原始文本内容")
+    target_language: str = Field(description="目标语言，例如：英语、日语、法语")
+    translation: str = Field(description="把原文翻译成目标语言后的结果，只包含译文本身")
 
-# 完整 pipeline：解析链 → 转换 → 翻译链
-full_pipeline = (
-    parse_chain
-    | RunnableLambda(parse_result_to_dict)
-    | translate_chain
-)
+
+one_shot_parser = JsonOutputParser(pydantic_object=TranslateResult)
+
+one_shot_prompt = ChatPromptTemplate.from_messages([
+    (
+        "system",
+        "你是一个专业翻译，精通各国语言。\n"
+        "请从用户的翻译请求中识别：1）需要翻译的原文  2）目标语言，"
+        "然后把原文准确翻译成目标语言。译文中不要加任何解释或多余文字。\n\n"
+        "{format_instructions}"
+    ),
+    (
+        "human",
+        "{user_input}"
+    ),
+]).partial(format_instructions=one_shot_parser.get_format_instructions())
+
+# 单次调用链：提示词 → 模型 → JSON 解析器（流式调用时逐次产出部分结果）
+one_shot_chain = one_shot_prompt | model | one_shot_parser
 
 
 # ============================================================
 # 供 Gradio 调用的主函数
 # 同时返回中间解析结果，让用户看到 Agent 的推理过程
+#
+# translate 是生成器函数，Gradio 会自动识别生成器并逐次刷新：
+#   - 单次调用时，解析结果先出现，译文随后一段一段地流式推送
+#   - 退回两段式时，先推解析结果，译文同样流式推送
 # ============================================================
+def format_parse_info(source_text: str, target_language: str) -> str:
+    return (
+        f"解析结果：\n"
+        f"  原文：{source_text}\n"
+        f"  目标语言：{target_language}"
+    )
+
+
 def translate(user_input: str):
     if not user_input.strip():
-        return "请输入翻译指令", ""
+        yield "请输入翻译指令", ""
+        return
 
-    # Step 1：调用解析链，提取原文和目标语言
-    parsed: ParseResult = parse_chain.invoke({
-        "user_input": user_input,
-        "format_instructions": parse_parser.get_format_instructions(),
-    })
+    # 优先走单次调用：一次请求同时拿到解析结果和译文，边生成边显示
+    # partial 是目前为止解析出的部分 JSON，字段按 原文 → 目标语言 → 译文 的顺序陆续出现
+    partial = {}
+    try:
+        for partial in one_shot_chain.stream({"user_input": user_input}):
+            if not isinstance(partial, dict):   # 模型没按要求输出 JSON 对象，结束后会校验失败并退回两段式
+                continue
+            yield (
+                format_parse_info(partial.get("source_text") or "", partial.get("target_language") or ""),
+                partial.get("translation") or "",
+            )
+        combined = TranslateResult.model_validate(partial)
+    except (OutputParserException, ValidationError):
+        combined = None
 
-    # Step 2：调用翻译链，执行翻译
-    result = translate_chain.invoke({
-        "source_text": parsed.source_text,
-        "target_language": parsed.target_language,
-    })
+    if combined is not None:
+        yield format_parse_info(combined.source_text, combined.target_language), combined.translation
+        return
+
+    # 单次调用的输出解析失败，退回两段式：先解析，再流式翻译
+    # Step 1：调用解析链，提取原文和目标语言
+    parsed: ParseResult = parse_chain.invoke({"user_input": user_input})
 
     # 把解析过程展示出来，便于理解
-    parse_info = (
-        f"解析结果：\n"
-        f"  原文：{parsed.source_text}\n"
-        f"  目标语言：{parsed.target_language}"
-    )
+    parse_info = format_parse_info(parsed.source_text, parsed.target_language)
+    yield parse_info, ""
 
-    return parse_info, result
+    # Step 2：流式调用翻译链，边翻译边显示
+    result = ""
+    for chunk in translate_chain.stream({
+        "source_text": parsed.source_text,
+        "target_language": parsed.target_language,
+    }):
+        result += chunk
+        yield parse_info, result
 
 
 # ============================================================
 # Gradio 界面
+#
+# gradio 本身导入就要一两秒（会连带加载 fastapi、httpx、大量前端资源描述）。
+# 放进 build_app() 里，只有真正启动界面时才导入；
+# 其他脚本只想复用 translate() 时，import 本文件不用付这笔开销。
 # ============================================================
-with gr.Blocks(title="AI 翻译助手") as app:
-
-    gr.Markdown("# AI 翻译助手")
-    gr.Markdown(
-        "直接输入翻译指令，Agent 会自动解析原文和目标语言，再执行翻译：\n"
-        "- `帮我把人工智能正在改变世界翻译成英语`\n"
-        "- `把下面这段话翻译成日语：我今天很开心`\n"
-        "- `translate hello world to Chinese`"
-    )
+def build_app():
+    import gradio as gr
 
-    with gr.Column():
-        input_text = gr.Textbox(
-            label="翻译指令",
-            placeholder="例如：帮我把人工智能正在改变世界翻译成英语",
-            lines=3,
-        )
-        translate_btn = gr.Button("翻译", variant="primary")
-
-    with gr.Row():
-        # 左侧展示解析结果（Chain 1 的输出）
-        parse_output = gr.Textbox(
-            label="Chain 1 解析结果",
-            lines=4,
-            interactive=False,
+    with gr.Blocks(title="AI 翻译助手") as app:
+
+        gr.Markdown("# AI 翻译助手")
+        gr.Markdown(
+            "直接输入翻译指令，Agent 会自动识别原文和目标语言并完成翻译：\n"
+            "- `帮我把人工智能正在改变世界翻译成英语`\n"
+            "- `把下面这段话翻译成日语：我今天很开心`\n"
+            "- `translate hello world to Chinese`"
         )
-        # 右侧展示翻译结果（Chain 2 的输出）
-        translate_output = gr.Textbox(
-            label="Chain 2 翻译结果",
-            lines=4,
-            interactive=False,
+
+        with gr.Column():
+            input_text = gr.Textbox(
+                label="翻译指令",
+                placeholder="例如：帮我把人工智能正在改变世界翻译成英语",
+                lines=3,
+            )
+            translate_btn = gr.Button("翻译", variant="primary")
+
+        with gr.Row():
+            # 左侧展示解析结果（原文和目标语言）
+            parse_output = gr.Textbox(
+                label="解析结果",
+                lines=4,
+                interactive=False,
+            )
+            # 右侧展示翻译结果
+            translate_output = gr.Textbox(
+                label="翻译结果",
+                lines=4,
+                interactive=False,
+            )
+
+        translate_btn.click(
+            fn=translate,
+            inputs=input_text,
+            outputs=[parse_output, translate_output],
         )
 
-    translate_btn.click(
-        fn=translate,
-        inputs=input_text,
-        outputs=[parse_output, translate_output],
-    )
+        input_text.submit(
+            fn=translate,
+            inputs=input_text,
+            outputs=[parse_output, translate_output],
+        )
 
-    input_text.submit(
-        fn=translate,
-        inputs=input_text,
-        outputs=[parse_output, translate_output],
-    )
+    return app
 
 
 if __name__ == "__main__":
-    app.launch(
+    build_app().launch(
         server_name="0.0.0.0",
         server_port=7860,
         share=False,
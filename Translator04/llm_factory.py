@@ -0,0 +1,52 @@
+"""
+llm_factory.py
+==============
+Translator04 里 app.py（Gradio 版）和 translator_agent.py（命令行版）共用的模型工厂。
+
+get_model(temperature) 按参数缓存 ChatDeepSeek 实例：
+  - 同一进程里同样的参数只创建一次，省掉重复的参数校验和客户端初始化
+  - 所有实例共用同一组 httpx 客户端，连接池和已建立的 TLS 连接在各条 chain 之间复用
+
+enable_llm_cache() 开启本地 SQLite LLM 缓存：
+  同一句话重复提交（反复点"翻译"、开发时重跑）时，相同的（提示词 + 模型参数）
+  直接从本地文件返回，不再请求 DeepSeek。只有 invoke() / batch() 会查缓存，stream() 不会。
+  缓存文件固定在本目录下的 .langchain_cache.db（不随运行时的当前目录变化），
+  想看到模型的新回答时，删掉它即可。
+"""
+
+import os
+from functools import lru_cache
+from pathlib import Path
+
+import httpx
+from langchain_deepseek import ChatDeepSeek
+
+POOL_LIMITS = httpx.Limits(max_keepalive_connections=20, max_connections=40)
+
+# DeepSeek 走 HTTPS，可以协商 HTTP/2，多个并发请求复用同一条连接
+HTTP_CLIENT = httpx.Client(http2=True, limits=POOL_LIMITS)
+HTTP_ASYNC_CLIENT = httpx.AsyncClient(http2=True, limits=POOL_LIMITS)
+
+
+@lru_cache(maxsize=8)
+def get_model(*, temperature: float = 0.0, model: str = "deepseek-chat") -> ChatDeepSeek:
+    """按 (temperature, model) 缓存的 ChatDeepSeek 工厂，同样的参数返回同一个实例"""
+    return ChatDeepSeek(
+        model=model,
+        api_key=os.environ.get("DEEPSEEK_API_KEY"),
+        temperature=temperature,
+        http_client=HTTP_CLIENT,
+        http_async_client=HTTP_ASYNC_CLIENT,
+    )
+
+
+# 按本文件所在目录定位，从仓库根目录运行 python Translator04/xxx.py 也写到这里
+LLM_CACHE_PATH = Path(__file__).with_name(".langchain_cache.db")
+
+
+def enable_llm_cache() -> None:
+    """开启本地 SQLite LLM 缓存（全局生效，对之后所有模型调用都有效）"""
+    from langchain_core.globals import set_llm_cache
+    from langchain_community.cache import SQLiteCache
+
+    set_llm_cache(SQLiteCache(database_path=str(LLM_CACHE_PATH)))
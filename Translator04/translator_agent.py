@@ -1,8 +1,5 @@
-import os
 import sys
-from langchain_deepseek import ChatDeepSeek
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.output_parsers import StrOutputParser
+import functools
 
 sys.stdout.reconfigure(encoding="utf-8")
 
@@ -23,29 +20,43 @@ sys.stdout.reconfigure(encoding="utf-8")
 #   返回翻译结果
 # ============================================================
 
-# 初始化模型
-model = ChatDeepSeek(
-    model="deepseek-chat",
-    api_key=os.environ.get("DEEPSEEK_API_KEY"),
-    temperature=0.3,    # 翻译场景用低温度，保证准确性，减少"发挥"
-)
-
-# 翻译提示词模板
-translate_prompt = ChatPromptTemplate.from_messages([
-    (
-        "system",
-        "你是一个专业翻译，精通各国语言。"
-        "请将用户提供的文本准确翻译成目标语言。"
-        "只输出翻译结果，不要加任何解释、注释或多余文字。"
-    ),
-    (
-        "human",
-        "请将以下文本翻译成{target_language}：\n\n{text}"
-    ),
-])
-
-# 构建翻译 chain：提示词 → 模型 → 解析器
-translate_chain = translate_prompt | model | StrOutputParser()
+# ============================================================
+# 延迟构建翻译 chain
+#
+# langchain_deepseek / langchain_community 导入时会连带加载几百个子模块，
+# 冷启动要好几秒。这些导入和 chain 的构建都放进 get_translate_chain()，
+# 第一次真正需要翻译时才执行；只 import 本文件、或还没开始翻译时不付这笔开销。
+# lru_cache 保证 chain 只构建一次，之后每次调用直接复用。
+# ============================================================
+@functools.lru_cache(maxsize=None)
+def get_translate_chain():
+    from llm_factory import get_model, enable_llm_cache
+    from langchain_core.prompts import ChatPromptTemplate
+    from langchain_core.output_parsers import StrOutputParser
+
+    # 初始化模型（llm_factory 按参数缓存实例，HTTP 连接池与 app.py 共用）
+    model = get_model(temperature=0.3)    # 翻译场景用低温度，保证准确性，减少"发挥"
+
+    # 开启本地 LLM 缓存：交互模式里重复翻译同一段文本时直接读本地文件（说明见 llm_factory.py）
+    enable_llm_cache()
+
+    # 翻译提示词模板
+    translate_prompt = ChatPromptTemplate.from_messages([
+        (
+            "system",
+            "你是一个专业翻译，精通各国语言。"
+            "请将用户提供的文本准确翻译成目标语言。"
+            "只输出翻译结果，不要加任何解释、注释或多余文字。"
+        ),
+        (
+            "human",
+            "请将以下文本翻译成{target_language}：\n\n{text}"
+        ),
+    ])
+
+    # 构建翻译 chain：提示词 → 模型 → 解析器
+    translate_chain = translate_prompt | model | StrOutputParser()
+    return translate_chain
 
 
 def translate(text: str, target_language: str) -> str:
@@ -55,7 +66,7 @@ def translate(text: str, target_language: str) -> str:
     :param target_language: 目标语言，例如：英语、日语、法语、西班牙语
     :return: 翻译结果
     """
-    result = translate_chain.invoke({
+    result = get_translate_chain().invoke({
         "text": text,
         "target_language": target_language,
     })
@@ -1,10 +1,12 @@
 import os
 import sys
+import httpx
 import gradio as gr
 from langchain_deepseek import ChatDeepSeek
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.messages import HumanMessage, AIMessage
+from langchain_core.messages.utils import trim_messages
 from langchain_core.chat_history import InMemoryChatMessageHistory
 from langchain_core.runnables.history import RunnableWithMessageHistory
 
@@ -25,35 +27,52 @@ sys.stdout.reconfigure(encoding="utf-8")
 #   - 每轮对话自动把历史注入 prompt，模型能记住上文
 # ============================================================
 
+# 多个浏览器 tab 会同时对话，所有请求共用一组 HTTP/2 连接池：
+# 并发请求在同一条 TCP + TLS 连接上多路复用，不用每个请求各做一次握手
+POOL_LIMITS = httpx.Limits(max_keepalive_connections=20, max_connections=40)
+
 model = ChatDeepSeek(
     model="deepseek-chat",
     api_key=os.environ.get("DEEPSEEK_API_KEY"),
     temperature=0.7,
+    http_client=httpx.Client(http2=True, limits=POOL_LIMITS),
+    http_async_client=httpx.AsyncClient(http2=True, limits=POOL_LIMITS),
 )
 
 # ============================================================
 # 提示词：定义评测助手的"性格"和专业能力
 # MessagesPlaceholder 是历史消息的占位符，记忆会自动填入这里
+#
+# DeepSeek 前缀缓存：
+#   DeepSeek 会自动缓存请求开头相同的部分（无需额外参数），
+#   命中部分的输入 token 按缓存价格计费，首 token 也返回得更快。
+#   这段 System Prompt 有几百字，所有用户、所有轮次都完全一样，
+#   只要它始终一字不差地放在消息列表第一位，每次请求都能命中缓存。
+#   所以 SYSTEM_PROMPT 写成固定常量，不要往里拼接时间、用户名等会变的内容。
 # ============================================================
+SYSTEM_PROMPT = (
+    "你是一位资深手机评测专家，有超过10年的手机评测经验，"
+    "熟悉苹果、三星、华为、小米、OPPO、vivo、一加等各大品牌。\n\n"
+    "你的评测风格：\n"
+    "- 客观公正，既说优点也指出缺点\n"
+    "- 数据说话，引用真实的跑分、参数、实测数据\n"
+    "- 结合使用场景给出建议（学生党、商务人士、摄影爱好者等）\n"
+    "- 语言简洁易懂，避免过度堆砌专业术语\n"
+    "- 每次回答控制在500字以内，言简意赅\n\n"
+    "【重要：上下文追踪规则】\n"
+    "你必须始终追踪对话中出现过的所有手机型号，建立一个隐式的「品牌→型号」映射。\n"
+    "规则如下：\n"
+    "1. 用户只说品牌名（如「华为」）时，自动关联该品牌在对话中最近提到的具体型号，"
+    "并在回答开头确认，例如：「根据我们之前的对话，您说的华为应该是指华为 Mate 50，以下是对比：」\n"
+    "2. 若同一品牌在对话中出现过多个型号，则主动询问：「您说的华为是指 Mate 50 还是其他型号？」\n"
+    "3. 绝对不能猜测一个对话中从未出现过的型号。"
+)
+
+# 调试面板开头的 System Prompt 部分每轮都一样，模块加载时拼好一次
+DEBUG_HEADER = f"# 本次实际发给 LLM 的完整消息\n\n## System Prompt\n{SYSTEM_PROMPT}"
+
 prompt = ChatPromptTemplate.from_messages([
-    (
-        "system",
-        "你是一位资深手机评测专家，有超过10年的手机评测经验，"
-        "熟悉苹果、三星、华为、小米、OPPO、vivo、一加等各大品牌。\n\n"
-        "你的评测风格：\n"
-        "- 客观公正，既说优点也指出缺点\n"
-        "- 数据说话，引用真实的跑分、参数、实测数据\n"
-        "- 结合使用场景给出建议（学生党、商务人士、摄影爱好者等）\n"
-        "- 语言简洁易懂，避免过度堆砌专业术语\n"
-        "- 每次回答控制在500字以内，言简意赅\n\n"
-        "【重要：上下文追踪规则】\n"
-        "你必须始终追踪对话中出现过的所有手机型号，建立一个隐式的「品牌→型号」映射。\n"
-        "规则如下：\n"
-        "1. 用户只说品牌名（如「华为」）时，自动关联该品牌在对话中最近提到的具体型号，"
-        "并在回答开头确认，例如：「根据我们之前的对话，您说的华为应该是指华为 Mate 50，以下是对比：」\n"
-        "2. 若同一品牌在对话中出现过多个型号，则主动询问：「您说的华为是指 Mate 50 还是其他型号？」\n"
-        "3. 绝对不能猜测一个对话中从未出现过的型号。"
-    ),
+    ("system", SYSTEM_PROMPT),
     MessagesPlaceholder(variable_name="history"),   # 历史消息自动填入
     ("human", "{input}"),
 ])
@@ -64,13 +83,34 @@ base_chain = prompt | model | StrOutputParser()
 # 用字典存储所有 session 的对话历史
 # key = session_id（每个用户/tab 一个）
 # value = InMemoryChatMessageHistory 对象
+#
+# 历史的 token 预算：
+#   每一轮都会把全部历史重新发给模型，聊得越久，每轮的输入 token 越多，
+#   费用和等待时间都跟着线性增长。这里只保留最近约 HISTORY_TOKEN_BUDGET 个 token 的消息，
+#   更早的消息直接丢弃（存下来的也是裁剪后的历史，内存同样有上限）。
+#   System Prompt 在 prompt 模板里，不在历史中，不会被裁掉。
+#
+#   token 数交给 model 统计（ChatDeepSeek 继承了 OpenAI 的计数方法，底层是 tiktoken）。
+#   不用 count_tokens_approximately：它按"约 4 个字符 1 个 token"估算，只适合英文；
+#   中文差不多一个字就是一个 token，按它估算，实际保留的历史会是预算的 4 倍左右。
 # ============================================================
+HISTORY_TOKEN_BUDGET = 2000
+
 session_store = {}
 
 def get_session_history(session_id: str) -> InMemoryChatMessageHistory:
     if session_id not in session_store:
         session_store[session_id] = InMemoryChatMessageHistory()
-    return session_store[session_id]
+
+    history = session_store[session_id]
+    history.messages = trim_messages(
+        history.messages,
+        max_tokens=HISTORY_TOKEN_BUDGET,
+        token_counter=model,                        # 用模型自带的 tiktoken 分词器计数
+        strategy="last",                            # 从最新的消息往前保留
+        start_on="human",                           # 保证历史从用户消息开始，不留半轮
+    )
+    return history
 
 # 用 RunnableWithMessageHistory 包装，赋予记忆能力
 agent = RunnableWithMessageHistory(
@@ -84,25 +124,28 @@ agent = RunnableWithMessageHistory(
 # ============================================================
 # Gradio 对话函数
 #
-# Gradio Chatbot 组件的消息格式是列表：
-#   [ [用户消息, 助手回复], [用户消息, 助手回复], ... ]
+# Gradio Chatbot 使用 type="messages" 格式，历史是 OpenAI 风格的消息字典列表：
+#   [ {"role": "user", "content": ...}, {"role": "assistant", "content": ...}, ... ]
+# 每轮只在末尾追加两条消息，流式更新时只改最后一条 assistant 的 content。
 #
 # 流程：
 #   1. 把用户消息发给 Agent（Agent 内部自动读取历史）
-#   2. 拿到回复后追加到 Gradio 的 chat_history 列表
-#   3. 返回更新后的列表，Gradio 自动刷新界面
+#   2. 流式接收回复，每收到一段就更新 chat_history 最后一条
+#   3. yield 更新后的列表，Gradio 逐次刷新界面（打字机效果）
+#
+# chat 是生成器函数，Gradio 会自动识别并流式推送每次 yield 的结果。
+# 用户不用等整段回复生成完，第一个 token 到达时就能看到内容。
 # ============================================================
 def chat(user_input: str, chat_history: list, session_id: str):
     if not user_input.strip():
-        return "", chat_history, ""
+        yield "", chat_history, ""
+        return
 
     # 调用前先拿到当前历史，构造"实际发给 LLM 的完整消息"用于展示
     history_msgs = get_session_history(session_id).messages
 
-    # 拼接调试信息：展示每一条实际发给 LLM 的消息
-    debug_lines = ["# 本次实际发给 LLM 的完整消息\n"]
-    debug_lines.append("## System Prompt")
-    debug_lines.append(prompt.messages[0].prompt.template)
+    # 拼接调试信息：展示每一条实际发给 LLM 的消息（System Prompt 部分是固定的，直接用预先拼好的）
+    debug_lines = [DEBUG_HEADER]
     debug_lines.append(f"\n## 历史消息（共 {len(history_msgs)} 条）")
     for i, msg in enumerate(history_msgs):
         role = "用户" if msg.type == "human" else "助手"
@@ -111,14 +154,15 @@ def chat(user_input: str, chat_history: list, session_id: str):
     debug_lines.append(user_input)
     debug_text = "\n".join(debug_lines)
 
-    # 调用 Agent
-    response = agent.invoke(
+    # 流式调用 Agent，流结束后 RunnableWithMessageHistory 会把完整的一轮写回历史
+    chat_history.append({"role": "user", "content": user_input})
+    chat_history.append({"role": "assistant", "content": ""})
+    for chunk in agent.stream(
         {"input": user_input},
         config={"configurable": {"session_id": session_id}},
-    )
-
-    chat_history.append((user_input, response))
-    return "", chat_history, debug_text
+    ):
+        chat_history[-1]["content"] += chunk
+        yield "", chat_history, debug_text
 
 
 def clear_history(session_id: str):
@@ -144,7 +188,7 @@ with gr.Blocks(title="手机评测助手") as app:
             "支持多轮对话，问完一个问题可以继续追问，我会记住我们聊过的内容。"
         )
 
-        chatbot = gr.Chatbot(label="对话记录", height=480)
+        chatbot = gr.Chatbot(label="对话记录", type="messages", height=480)
 
         with gr.Row():
             input_box = gr.Textbox(
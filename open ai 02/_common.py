@@ -0,0 +1,39 @@
+"""
+_common.py
+==========
+open ai 02 里调用 DeepSeek 的各个 demo 共用的初始化代码：
+
+  - 把标准输出设为 UTF-8（Windows 终端默认 GBK，打印中文会乱码）
+  - 指向 DeepSeek 的 OpenAI 客户端 client，底层用显式配置的 HTTP/2 连接池
+
+为什么自己传 http_client？
+  OpenAI SDK 默认每个 client 各建一个 httpx 连接池。
+  这里所有请求共用 HTTP_CLIENT：连续的请求复用已经握手好的 TCP + TLS 连接，
+  并发的请求（比如 demo05 同时执行多个工具后的调用）在同一条 HTTP/2 连接上多路复用。
+  OpenAI 是同步客户端，要传同步的 httpx.Client；HTTP/2 需要 pip install "httpx[http2]"。
+  需要换 base_url 的场景（比如 demo02 的 beta 端点）用 client.with_options(base_url=...)，
+  派生出来的 client 仍然共用这个连接池。
+
+OpenAI 客户端的创建方式在 demo01_list_models.py 里单独演示；
+demo06 的 Assistants API 连的是 OpenAI 官方地址，用的是自己的异步客户端，不走这里。
+"""
+
+import os
+import sys
+
+import httpx
+from openai import OpenAI
+
+sys.stdout.reconfigure(encoding="utf-8")
+
+HTTP_CLIENT = httpx.Client(
+    http2=True,
+    timeout=httpx.Timeout(60.0, connect=5.0),
+    limits=httpx.Limits(max_keepalive_connections=20, max_connections=40),
+)
+
+client = OpenAI(
+    api_key=os.environ.get("DEEPSEEK_API_KEY"),
+    base_url="https://api.deepseek.com",
+    http_client=HTTP_CLIENT,
+)
@@ -1,18 +1,66 @@
-import os
-import sys
-from openai import OpenAI
+import json
+import time
+import hashlib
+import sqlite3
+from pathlib import Path
+from openai.types.chat import ChatCompletion
 
-sys.stdout.reconfigure(encoding="utf-8")
+# client 来自 _common.py：指向 DeepSeek，底层是共用的 HTTP/2 连接池，
+# 后面的请求（包括下面 beta 端点的请求）复用已经握手好的 TCP + TLS 连接
+from _common import client
 
-client = OpenAI(
-    api_key=os.environ.get("DEEPSEEK_API_KEY"),
-    base_url="https://api.deepseek.com",
+# ============================================================
+# 本地响应缓存
+#
+# 开发时同一段 demo 会反复运行，发出的请求参数一模一样，
+# 每次都要再等 0.5~2 秒、再花一次 token。
+# 这里把「请求参数 → 响应」存进本地 SQLite：
+#   key   = 全部请求参数序列化成 JSON 后的 SHA256
+#   value = 响应的 JSON（model_dump_json），读出来再还原成 ChatCompletion
+# 参数有任何一处不同（模型、消息、temperature、max_tokens……）都会生成新的 key。
+# 缓存 24 小时后过期；想强制重新请求，删掉本目录下的 .llm_cache.db 即可。
+# 流式请求（stream=True）拿到的是边读边出的 Stream 对象，没有完整响应可存，直接透传不缓存。
+# ============================================================
+# 按本文件所在目录定位，从仓库根目录运行 python "open ai 02/demo02_chat_completion.py" 也写到这里
+CACHE_PATH = Path(__file__).with_name(".llm_cache.db")
+CACHE_TTL = 24 * 60 * 60  # 秒
+
+cache_db = sqlite3.connect(CACHE_PATH)
+cache_db.execute(
+    "CREATE TABLE IF NOT EXISTS completions (key TEXT PRIMARY KEY, response TEXT, created REAL)"
 )
 
+
+def cached_completion(**kwargs) -> ChatCompletion:
+    """参数与 client.chat.completions.create 完全相同，命中缓存时不发请求；stream=True 时不走缓存"""
+    if kwargs.get("stream"):
+        return client.chat.completions.create(**kwargs)
+
+    key = hashlib.sha256(
+        json.dumps(kwargs, sort_keys=True, ensure_ascii=False).encode("utf-8")
+    ).hexdigest()
+
+    row = cache_db.execute(
+        "SELECT response, created FROM completions WHERE key = ?", (key,)
+    ).fetchone()
+    if row and time.time() - row[1] < CACHE_TTL:
+        return ChatCompletion.model_validate_json(row[0])
+
+    response = client.chat.completions.create(**kwargs)
+    with cache_db:
+        cache_db.execute(
+            "INSERT OR REPLACE INTO completions VALUES (?, ?, ?)",
+            (key, response.model_dump_json(), time.time()),
+        )
+    return response
+
+
 # ============================================================
 # chat.completions.create 参数说明
+#
+# 下面通过 cached_completion 调用，参数原样传给 chat.completions.create
 # ============================================================
-response = client.chat.completions.create(
+response = cached_completion(
     # model: 指定使用的模型名称
     model="deepseek-chat",
 
@@ -136,10 +184,11 @@ print(response.choices[0].message.content)
 #   - 旧版：输入是一段纯文本 prompt，模型直接续写
 #
 # 注意：DeepSeek 的旧版 API 需要使用 beta 端点，
-#       因此这里单独创建一个指向 /beta 的 client。
+#       因此这里需要一个指向 /beta 的 client。
+#       用 with_options 从现有 client 派生，只换 base_url，
+#       API Key、超时和底层连接池都沿用原来的，不用再创建一个完整的 client。
 # ============================================================
-client_beta = OpenAI(
-    api_key=os.environ.get("DEEPSEEK_API_KEY"),
+client_beta = client.with_options(
     base_url="https://api.deepseek.com/beta",  # ← beta 端点才支持旧版补全
 )
 
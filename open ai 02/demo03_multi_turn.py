@@ -1,13 +1,4 @@
-import os
-import sys
-from openai import OpenAI
-
-sys.stdout.reconfigure(encoding="utf-8")
-
-client = OpenAI(
-    api_key=os.environ.get("DEEPSEEK_API_KEY"),
-    base_url="https://api.deepseek.com",
-)
+from _common import client
 
 # ============================================================
 # 多轮对话的核心：用一个列表维护完整的对话历史
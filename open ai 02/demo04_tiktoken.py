@@ -1,4 +1,7 @@
+import os
 import sys
+from collections import OrderedDict
+from functools import lru_cache
 import tiktoken
 
 sys.stdout.reconfigure(encoding="utf-8")
@@ -38,7 +41,9 @@ print("词表大小  :", enc.n_vocab)   # 词表中 token 的总数量
 # ============================================================
 text = "Hello, how are you? 你好，今天天气怎么样？"
 
-tokens = enc.encode(text)
+# encode 会先扫描文本里有没有 <|endoftext|> 这类特殊 token（默认遇到就报错）；
+# 普通文本里不会有这些特殊 token，用 encode_ordinary 跳过这遍扫描，分词结果完全一样。
+tokens = enc.encode_ordinary(text)
 
 print()
 print("=" * 50)
@@ -60,9 +65,9 @@ print("还原文本  :", restored)
 print()
 print("=" * 50)
 print("逐 token 拆解:")
-for token_id in tokens:
-    # decode_single_token_bytes 返回该 token 对应的原始字节
-    token_bytes = enc.decode_single_token_bytes(token_id)
+# decode_tokens_bytes 一次调用返回每个 token 对应的原始字节列表，
+# 不用对每个 token 单独调用一次 decode_single_token_bytes（每次都要进出一趟 Rust）
+for token_id, token_bytes in zip(tokens, enc.decode_tokens_bytes(tokens)):
     try:
         token_str = token_bytes.decode("utf-8")
     except UnicodeDecodeError:
@@ -73,7 +78,29 @@ for token_id in tokens:
 # 5. 计算 chat 请求的实际 token 数
 #    （OpenAI 格式：每条消息除内容外还有固定的结构开销）
 # ============================================================
-def count_tokens_for_messages(messages: list, model: str = "gpt-4o") -> int:
+@lru_cache(maxsize=None)
+def _get_encoding(model: str) -> tiktoken.Encoding:
+    """按模型名查编码器，结果缓存：同一个模型只做一次查找（未知模型退回 cl100k_base）"""
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+
+
+# 每个字符串的 token 数缓存（LRU）：
+#   每次请求都会带上 "system" / "user" 这些 role，System Prompt 往往也一字不差，
+#   重复的字符串直接查表，不用再分词。
+#   key 带上编码名称，换了模型（编码不同）不会查到旧结果。
+#   用 OrderedDict 实现 LRU：命中时移到末尾，超过上限时淘汰最久没用的。
+TOKEN_LEN_CACHE_SIZE = 4096
+_token_len_cache = OrderedDict()   # (编码名称, 字符串) -> token 数
+
+
+# 没命中缓存的字符串少于这个数时逐条编码：条数太少时，批量接口分发线程的开销比省下的还多
+BATCH_ENCODE_MIN = 8
+
+
+def count_tokens_for_messages(messages: list, model: str = "gpt-4o", num_threads: int | None = None) -> int:
     """
     参照 OpenAI 官方公式计算 messages 列表的 token 数。
     每条消息固定额外消耗：
@@ -81,18 +108,47 @@ def count_tokens_for_messages(messages: list, model: str = "gpt-4o") -> int:
       - role 字段本身的 token
       - content 字段本身的 token
     整个请求末尾还有 3 token 的固定开销（<|im_start|>assistant）
+    num_threads：批量编码用的线程数，默认等于 CPU 核数
     """
-    try:
-        encoding = tiktoken.encoding_for_model(model)
-    except KeyError:
-        encoding = tiktoken.get_encoding("cl100k_base")
+    encoding = _get_encoding(model)
 
     tokens_per_message = 3
-    total = 0
-    for message in messages:
-        total += tokens_per_message
-        for value in message.values():
-            total += len(encoding.encode(value))
+
+    values = [value for message in messages for value in message.values()]
+
+    # 先查缓存，没命中的字符串收集起来（去重）
+    lengths = {}
+    misses = []
+    for value in values:
+        key = (encoding.name, value)
+        if key in _token_len_cache:
+            _token_len_cache.move_to_end(key)
+            lengths[value] = _token_len_cache[key]
+        elif value not in lengths:
+            lengths[value] = None
+            misses.append(value)
+
+    # 没命中的字符串多时用 encode_ordinary_batch 一次编码：
+    # tiktoken 的核心是 Rust 实现，批量编码时会释放 GIL、用多个线程并行分词，
+    # 比在 Python 里逐条调用 encode 快，消息越多越明显。
+    # 只有几条时直接逐条编码，省掉线程池的调度开销。
+    # ordinary 版本把 <|endoftext|> 这类特殊 token 当普通文本处理：
+    # 省掉逐条扫描特殊 token 的检查，消息内容里碰巧出现这些字符串时也不会抛异常。
+    if misses:
+        if len(misses) < BATCH_ENCODE_MIN:
+            encoded = [encoding.encode_ordinary(value) for value in misses]
+        else:
+            encoded = encoding.encode_ordinary_batch(
+                misses, num_threads=num_threads or os.cpu_count() or 1
+            )
+        for value, ids in zip(misses, encoded):
+            lengths[value] = len(ids)
+            _token_len_cache[(encoding.name, value)] = len(ids)
+        while len(_token_len_cache) > TOKEN_LEN_CACHE_SIZE:
+            _token_len_cache.popitem(last=False)
+
+    total = tokens_per_message * len(messages)
+    total += sum(lengths[value] for value in values)
     total += 3   # 末尾固定开销
     return total
 
@@ -1,14 +1,10 @@
-import os
-import sys
 import json
-from openai import OpenAI
+import time
+import ast
+import functools
+from concurrent.futures import ThreadPoolExecutor
 
-sys.stdout.reconfigure(encoding="utf-8")
-
-client = OpenAI(
-    api_key=os.environ.get("DEEPSEEK_API_KEY"),
-    base_url="https://api.deepseek.com",
-)
+from _common import client
 
 # ============================================================
 # Function Call（工具调用）是什么？
@@ -30,29 +26,72 @@ client = OpenAI(
 # Step 1：定义本地函数（模型不会直接执行这些，我们来执行）
 # ============================================================
 
+# 模拟天气数据放在模块级，只构建一次，每次调用只做一次字典查找
+_WEATHER_DATA = {
+    "北京": "晴，气温 -2°C，西北风 3 级",
+    "上海": "阴，气温 8°C，东南风 2 级",
+    "广州": "多云，气温 18°C，南风 1 级",
+}
+
+
+# 天气查询结果缓存 10 分钟：
+#   真实场景里每次查询都是一次天气 API 请求，同一段对话里模型常常反复问同一个城市，
+#   缓存命中时直接返回，不再请求 API。
+#   把「当前是第几个 10 分钟」作为缓存 key 的一部分：时间段一变 key 就变，
+#   旧结果自然失效，最久没用的条目由 lru_cache 按容量淘汰。
+WEATHER_CACHE_TTL = 10 * 60  # 秒
+
+
+@functools.lru_cache(maxsize=1024)
+def _fetch_weather(city: str, time_bucket: int) -> str:
+    """模拟调用天气 API；time_bucket 只参与缓存 key，不影响查询本身"""
+    return _WEATHER_DATA.get(city, f"暂无 {city} 的天气数据")
+
+
 def get_weather(city: str) -> str:
     """模拟查询天气，真实场景中这里会调用天气 API"""
-    mock_data = {
-        "北京": "晴，气温 -2°C，西北风 3 级",
-        "上海": "阴，气温 8°C，东南风 2 级",
-        "广州": "多云，气温 18°C，南风 1 级",
-    }
-    return mock_data.get(city, f"暂无 {city} 的天气数据")
+    return _fetch_weather(city, int(time.time() // WEATHER_CACHE_TTL))
+
+
+# 语法树白名单计算器，和 LangChain03/demo07_react_agent.py 的 calculate 是同一份实现，
+# 为什么这样做（包括为什么不允许 **）见那里的注释。
+# 各目录的脚本各自独立运行、互不导入，所以这里抄了一份；改白名单时几处要一起改。
+_CALC_ALLOWED_NODES = (
+    ast.Expression, ast.BinOp, ast.UnaryOp, ast.Constant,
+    ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod,
+    ast.UAdd, ast.USub,
+)
+
+
+@functools.lru_cache(maxsize=512)
+def _compile_expression(expression: str):
+    """白名单检查后编译成字节码，按表达式字符串缓存"""
+    tree = ast.parse(expression.strip(), mode="eval")
+    for node in ast.walk(tree):
+        if not isinstance(node, _CALC_ALLOWED_NODES):
+            raise ValueError(f"不支持的语法：{type(node).__name__}，只支持基本数学运算")
+        if isinstance(node, ast.Constant) and not isinstance(node.value, (int, float)):
+            raise ValueError("表达式里只能出现数字")
+    return compile(tree, "<calculate>", "eval")
 
 
 def calculate(expression: str) -> str:
     """安全计算简单数学表达式"""
     try:
-        # 只允许数字和基本运算符，防止代码注入
-        allowed = set("0123456789+-*/(). ")
-        if not all(c in allowed for c in expression):
-            return "表达式包含非法字符"
-        result = eval(expression)
+        # 不给内置函数，即使白名单漏了什么也调不到 open、__import__ 之类
+        result = eval(_compile_expression(expression), {"__builtins__": {}}, {})
         return str(result)
     except Exception as e:
         return f"计算失败: {e}"
 
 
+# 函数名 → 本地函数，执行 tool_calls 时按名字查表分发
+TOOL_REGISTRY = {
+    "get_weather": get_weather,
+    "calculate": calculate,
+}
+
+
 # ============================================================
 # Step 2：把函数描述成模型能理解的 JSON Schema（工具清单）
 # ============================================================
@@ -130,40 +169,51 @@ response_message = response.choices[0].message
 # 把模型的回复（含 tool_calls）加入历史
 messages.append(response_message)
 
-# 遍历所有工具调用（模型可能一次请求调用多个工具）
-tool_results = []
-for tool_call in response_message.tool_calls:
+
+def run_tool_call(tool_call) -> str:
+    """执行一次工具调用，返回结果字符串"""
     func_name = tool_call.function.name
     # 模型返回的参数是 JSON 字符串，需要反序列化
     func_args = json.loads(tool_call.function.arguments)
+    func = TOOL_REGISTRY.get(func_name)
+    if func is None:
+        return f"未知函数: {func_name}"
+    return func(**func_args)
 
+
+# 模型可能一次请求调用多个工具（这里是 get_weather + calculate），
+# 它们之间互不依赖，用线程池同时执行：
+# 真实场景里工具多是查 API、查数据库这类等待网络的操作，
+# 总耗时从各个工具耗时之和降到最慢的那一个。
+# executor.map 按提交顺序返回结果，和 tool_calls 的顺序一一对应。
+for tool_call in response_message.tool_calls:
     print()
     print("=" * 55)
-    print(f"【本地执行】函数={func_name}，参数={func_args}")
+    print(f"【本地执行】函数={tool_call.function.name}，参数={tool_call.function.arguments}")
     print("=" * 55)
 
-    # 根据函数名分发调用
-    if func_name == "get_weather":
-        result = get_weather(**func_args)
-    elif func_name == "calculate":
-        result = calculate(**func_args)
-    else:
-        result = f"未知函数: {func_name}"
+with ThreadPoolExecutor() as executor:
+    results = list(executor.map(run_tool_call, response_message.tool_calls))
 
-    print(f"执行结果: {result}")
-    tool_results.append((tool_call.id, func_name, result))
+tool_results = []
+for tool_call, result in zip(response_message.tool_calls, results):
+    print(f"{tool_call.function.name} 执行结果: {result}")
+    tool_results.append((tool_call.id, tool_call.function.name, result))
 
 # ============================================================
 # Step 5：把执行结果发回给模型，获取最终回答
 # ============================================================
 # 每个工具结果对应一条 role="tool" 的消息
 # tool_call_id 用于让模型知道这个结果属于哪次工具调用
-for call_id, func_name, result in tool_results:
-    messages.append({
+# 所有工具结果一次性 extend 进 messages
+messages.extend(
+    {
         "role": "tool",
         "tool_call_id": call_id,   # 与 tool_call.id 对应
         "content": result,
-    })
+    }
+    for call_id, func_name, result in tool_results
+)
 
 print()
 print("=" * 55)
@@ -1,7 +1,10 @@
 import os
 import sys
-import time
-from openai import OpenAI
+import json
+import asyncio
+import hashlib
+from pathlib import Path
+from openai import AsyncOpenAI, NotFoundError
 
 sys.stdout.reconfigure(encoding="utf-8")
 
@@ -41,191 +44,274 @@ sys.stdout.reconfigure(encoding="utf-8")
 
 # ⚠️  Assistants API 是 OpenAI 独有功能，DeepSeek 不支持
 #     需要去 platform.openai.com 注册并获取 OPENAI_API_KEY
-client = OpenAI(
+#
+# 这里用异步客户端 AsyncOpenAI：每个调用都是 await，等待网络时不占着线程，
+# 互不依赖的请求（比如 Step 1 和 Step 2）可以用 asyncio.gather 同时发出，
+# 同一个事件循环里也能同时跑很多个 Thread 的对话。
+client = AsyncOpenAI(
     api_key=os.environ.get("OPENAI_API_KEY"),
     # 注意：这里不设置 base_url，使用 OpenAI 官方地址
 )
 
 
 # ============================================================
-# Step 1：创建 Assistant（助手配置）
-#
-# Assistant 就像一个"员工档案"：
-#   - 给它一个名字
-#   - 告诉它用什么大模型
-#   - 用 instructions 定义它的"性格/职责"（相当于 system prompt）
-#   - 可选开启内置工具（本 demo 先不用工具，保持简单）
-#
-# 关键点：Assistant 创建一次后会保存在 OpenAI 云端，
-#         可以被反复使用，不需要每次对话都重新创建。
-# ============================================================
-print("=" * 55)
-print("Step 1：创建 Assistant")
-print("=" * 55)
-
-assistant = client.beta.assistants.create(
-    name="学习小助手",                          # 助手的名字（便于识别）
-    model="gpt-4o-mini",                        # 使用的模型（mini 版本更便宜）
-    instructions=(                              # 相当于 system prompt，定义助手行为
-        "你是一个耐心的学习助手，专门帮助编程新手理解概念。"
-        "回答要简洁易懂，可以用比喻和举例。"
-        "每次回答后，主动问用户是否还有疑问。"
-    ),
-)
-
-print(f"✅ Assistant 创建成功！")
-print(f"   ID：{assistant.id}")     # 这个 ID 可以下次直接复用这个 assistant
-print(f"   名字：{assistant.name}")
-print()
-
-
-# ============================================================
-# Step 2：创建 Thread（对话线程）
-#
-# Thread 就像一个"聊天室"：
-#   - 每个用户或每次独立会话，创建一个 Thread
-#   - OpenAI 自动帮你存储这个 Thread 里的所有消息
-#   - 你只管发新消息，不需要手动维护历史记录
-#   - Thread 没有过期时间，可以随时继续之前的对话
-# ============================================================
-print("=" * 55)
-print("Step 2：创建 Thread（对话线程）")
-print("=" * 55)
-
-thread = client.beta.threads.create()
-
-print(f"✅ Thread 创建成功！")
-print(f"   ID：{thread.id}")       # 这个 ID 代表一次独立的对话会话
-print()
-
-
-# ============================================================
-# Step 3：向 Thread 添加用户消息
-#
-# 用户说的话，以 role="user" 加入 Thread。
-# 注意：加消息 ≠ 让助手回复，只是把消息放进去，
-#       下一步的 Run 才会触发助手处理消息。
-# ============================================================
-print("=" * 55)
-print("Step 3：用户发第一条消息")
-print("=" * 55)
-
-user_message_1 = "你好！能用一个生活中的比喻解释一下「线程」是什么吗？"
-print(f"用户：{user_message_1}")
-print()
-
-client.beta.threads.messages.create(
-    thread_id=thread.id,            # 指定加入哪个 Thread
-    role="user",                    # 角色固定是 "user"
-    content=user_message_1,         # 消息内容
-)
-
-
-# ============================================================
-# Step 4：创建 Run（触发助手处理消息）
-#
-# Run 是让助手"开始思考并回复"的指令。
-# Assistants API 是异步的——你发出 Run 请求后，
-# 需要轮询等待，直到状态变成 "completed"。
-#
-# Run 的状态流转：
-#   queued → in_progress → completed（正常情况）
-#                       → failed / expired（出错）
-#                       → requires_action（需要调用工具时）
-# ============================================================
-print("=" * 55)
-print("Step 4：创建 Run，等待助手回复...")
-print("=" * 55)
-
-# create_and_poll 是一个便捷方法，自动帮你轮询直到完成
-# 等价于：先 create run，再循环检查状态，直到 completed
-run = client.beta.threads.runs.create_and_poll(
-    thread_id=thread.id,
-    assistant_id=assistant.id,
-)
-
-print(f"Run 状态：{run.status}")    # 应该是 "completed"
-print()
-
-
-# ============================================================
-# Step 5：读取助手的回复
-#
-# 读取 Thread 里的消息列表，取最新的助手消息。
-# 消息列表默认按时间倒序排列（最新的在前面）。
-# ============================================================
-print("=" * 55)
-print("Step 5：读取助手回复")
-print("=" * 55)
-
-if run.status == "completed":
-    # 获取 Thread 中的所有消息（默认最新在前）
-    messages = client.beta.threads.messages.list(thread_id=thread.id)
-
-    # 第一条就是助手的最新回复
-    assistant_reply = messages.data[0].content[0].text.value
-    print(f"助手：{assistant_reply}")
-else:
-    print(f"❌ Run 未完成，状态：{run.status}")
-print()
-
-
-# ============================================================
-# Step 6：继续对话（体现 Thread 的核心价值）
+# Assistant 配置 + 本地 ID 缓存
 #
-# 关键！！这里不需要带上之前的历史消息，
-# Thread 已经记住了前面的对话内容，
-# 助手会自动基于上下文回答。
-#
-# 对比普通 Chat API：你需要手动把所有历史 messages 拼起来带上
-# Assistants API：只发新消息，历史自动保留
+# Assistant 创建一次后保存在云端，可以反复使用。
+# 这里把创建好的 Assistant ID 存到本地 .assistant_cache.json：
+#   key   = (模型 + instructions) 的 SHA256
+#   value = Assistant ID
+# 再次运行 demo 时直接复用，省掉一次创建请求；
+# 改了模型或 instructions，key 跟着变，会自动创建新的 Assistant。
+# 如果在 OpenAI 控制台删掉了这个 Assistant，第一次用它创建 Run 时会收到 404（NotFoundError），
+# 这时丢掉缓存的旧 ID、重新创建一个（见 Step 4），不用手动删缓存文件。
 # ============================================================
-print("=" * 55)
-print("Step 6：继续追问（Thread 自动记住上下文）")
-print("=" * 55)
-
-user_message_2 = "好的！那「进程」和「线程」有什么区别呢？"
-print(f"用户：{user_message_2}")
-print()
-
-# 直接加新消息，不需要带历史
-client.beta.threads.messages.create(
-    thread_id=thread.id,
-    role="user",
-    content=user_message_2,
+ASSISTANT_NAME = "学习小助手"                   # 助手的名字（便于识别）
+ASSISTANT_MODEL = "gpt-4o-mini"                 # 使用的模型（mini 版本更便宜）
+ASSISTANT_INSTRUCTIONS = (                      # 相当于 system prompt，定义助手行为
+    "你是一个耐心的学习助手，专门帮助编程新手理解概念。"
+    "回答要简洁易懂，可以用比喻和举例。"
+    "每次回答后，主动问用户是否还有疑问。"
 )
-
-# 再次 Run，助手知道上文说了"线程的比喻"，可以前后呼应
-run2 = client.beta.threads.runs.create_and_poll(
-    thread_id=thread.id,
-    assistant_id=assistant.id,
-)
-
-if run2.status == "completed":
-    messages = client.beta.threads.messages.list(thread_id=thread.id)
-    assistant_reply_2 = messages.data[0].content[0].text.value
-    print(f"助手：{assistant_reply_2}")
-print()
-
-
-# ============================================================
-# Step 7：清理资源（可选）
-#
-# Thread 和 Assistant 会持久保存在 OpenAI 云端，占用存储。
-# 如果这是临时测试，用完后删掉比较好。
-# 真实应用中，Thread 通常保留（用户下次可以继续聊），
-# Assistant 可以长期复用。
-# ============================================================
-print("=" * 55)
-print("Step 7：清理资源")
-print("=" * 55)
-
-client.beta.threads.delete(thread.id)
-print(f"✅ Thread {thread.id} 已删除")
-
-client.beta.assistants.delete(assistant.id)
-print(f"✅ Assistant {assistant.id} 已删除")
-print()
+# 按本文件所在目录定位，从仓库根目录运行也写到这里，不会在当前目录留下缓存文件
+ASSISTANT_CACHE_PATH = Path(__file__).with_name(".assistant_cache.json")
+
+
+async def get_or_create_assistant_id(*, refresh: bool = False) -> str:
+    """
+    返回配置相同的 Assistant ID：本地缓存里有就直接用，没有才创建。
+    refresh=True 时不看缓存，重新创建并覆盖缓存里的旧 ID（旧的 Assistant 已被删除时用）。
+    """
+    key = hashlib.sha256(
+        f"{ASSISTANT_MODEL}|{ASSISTANT_INSTRUCTIONS}".encode("utf-8")
+    ).hexdigest()
+
+    cache = {}
+    if ASSISTANT_CACHE_PATH.exists():
+        with open(ASSISTANT_CACHE_PATH, encoding="utf-8") as f:
+            cache = json.load(f)
+    if key in cache and not refresh:
+        return cache[key]
+
+    assistant = await client.beta.assistants.create(
+        name=ASSISTANT_NAME,
+        model=ASSISTANT_MODEL,
+        instructions=ASSISTANT_INSTRUCTIONS,
+    )
+    cache[key] = assistant.id
+    with open(ASSISTANT_CACHE_PATH, "w", encoding="utf-8") as f:
+        json.dump(cache, f, ensure_ascii=False, indent=2)
+    return assistant.id
+
+
+# Run 到了这些状态就不会再变，可以停止轮询
+RUN_FINAL_STATUSES = {"completed", "failed", "expired", "cancelled", "incomplete", "requires_action"}
+
+
+async def _poll_run(thread_id: str, run_id: str, *, initial=0.05, cap=1.0, timeout=120.0):
+    """
+    轮询 Run 状态，直到进入最终状态或超时，返回最后一次查到的 Run。
+
+    间隔从 initial 秒开始，每次翻倍，最多 cap 秒：
+      - 短回答很快完成，开头几次间隔很短，完成后几乎马上就能拿到结果
+      - 长回答要生成好几秒，间隔拉长后查询次数少很多，不浪费请求配额
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    delay = initial
+    while True:
+        run = await client.beta.threads.runs.retrieve(run_id, thread_id=thread_id)
+        if run.status in RUN_FINAL_STATUSES or loop.time() >= deadline:
+            return run
+        await asyncio.sleep(delay)   # 等待期间不占线程，事件循环可以去处理别的 Thread
+        delay = min(cap, delay * 2)
+
+
+async def main():
+    # ============================================================
+    # Step 1：创建 Assistant（助手配置）
+    #
+    # Assistant 就像一个"员工档案"：
+    #   - 给它一个名字
+    #   - 告诉它用什么大模型
+    #   - 用 instructions 定义它的"性格/职责"（相当于 system prompt）
+    #   - 可选开启内置工具（本 demo 先不用工具，保持简单）
+    #
+    # 关键点：Assistant 创建一次后会保存在 OpenAI 云端，
+    #         可以被反复使用，不需要每次对话都重新创建。
+    #         get_or_create_assistant_id 只在第一次运行时创建，之后复用缓存的 ID。
+    #
+    # Step 2：创建 Thread（对话线程）
+    #
+    # Thread 就像一个"聊天室"：
+    #   - 每个用户或每次独立会话，创建一个 Thread
+    #   - OpenAI 自动帮你存储这个 Thread 里的所有消息
+    #   - 你只管发新消息，不需要手动维护历史记录
+    #   - Thread 没有过期时间，可以随时继续之前的对话
+    #
+    # Step 1 和 Step 2 互不依赖，用 asyncio.gather 同时发出两个请求，
+    # 总等待时间是两次请求里较慢的那一次，而不是两次之和。
+    # ============================================================
+    print("=" * 55)
+    print("Step 1 + 2：创建 Assistant 和 Thread（同时发出）")
+    print("=" * 55)
+
+    assistant_id, thread = await asyncio.gather(
+        get_or_create_assistant_id(),
+        client.beta.threads.create(),
+    )
+
+    print(f"✅ Assistant 就绪！")
+    print(f"   ID：{assistant_id}")     # 这个 ID 已存进 .assistant_cache.json，下次直接复用
+    print(f"   名字：{ASSISTANT_NAME}")
+    print()
+
+    print(f"✅ Thread 创建成功！")
+    print(f"   ID：{thread.id}")       # 这个 ID 代表一次独立的对话会话
+    print()
+
+    # ============================================================
+    # Step 3：向 Thread 添加用户消息
+    #
+    # 用户说的话，以 role="user" 加入 Thread。
+    # 注意：加消息 ≠ 让助手回复，只是把消息放进去，
+    #       下一步的 Run 才会触发助手处理消息。
+    # ============================================================
+    print("=" * 55)
+    print("Step 3：用户发第一条消息")
+    print("=" * 55)
+
+    user_message_1 = "你好！能用一个生活中的比喻解释一下「线程」是什么吗？"
+    print(f"用户：{user_message_1}")
+    print()
+
+    await client.beta.threads.messages.create(
+        thread_id=thread.id,            # 指定加入哪个 Thread
+        role="user",                    # 角色固定是 "user"
+        content=user_message_1,         # 消息内容
+    )
+
+    # ============================================================
+    # Step 4：创建 Run（触发助手处理消息）
+    #
+    # Run 是让助手"开始思考并回复"的指令。
+    # Assistants API 是异步的——你发出 Run 请求后，
+    # 需要轮询等待，直到状态变成 "completed"。
+    #
+    # Run 的状态流转：
+    #   queued → in_progress → completed（正常情况）
+    #                       → failed / expired（出错）
+    #                       → requires_action（需要调用工具时）
+    # ============================================================
+    print("=" * 55)
+    print("Step 4：创建 Run，等待助手回复...")
+    print("=" * 55)
+
+    # 先 create run，再用 _poll_run 循环检查状态，直到完成
+    # （SDK 也有便捷方法 create_and_poll，但它按固定间隔轮询，
+    #   这里用间隔逐渐变长的轮询：短回答拿得更快，长回答查询次数更少）
+    try:
+        run = await client.beta.threads.runs.create(
+            thread_id=thread.id,
+            assistant_id=assistant_id,
+        )
+    except NotFoundError:
+        # Thread 刚创建，找不到的只能是缓存里的 Assistant（已在云端被删除）：重新创建后再试一次
+        print(f"⚠️  缓存的 Assistant {assistant_id} 已不存在，重新创建")
+        assistant_id = await get_or_create_assistant_id(refresh=True)
+        run = await client.beta.threads.runs.create(
+            thread_id=thread.id,
+            assistant_id=assistant_id,
+        )
+    run = await _poll_run(thread.id, run.id)
+
+    print(f"Run 状态：{run.status}")    # 应该是 "completed"
+    print()
+
+    # ============================================================
+    # Step 5：读取助手的回复
+    #
+    # 读取 Thread 里的消息列表，取最新的助手消息。
+    # 消息列表可以按时间倒序排列（最新的在前面），只取第一条即可。
+    # ============================================================
+    print("=" * 55)
+    print("Step 5：读取助手回复")
+    print("=" * 55)
+
+    if run.status == "completed":
+        # 只取 Thread 里最新的一条消息（order="desc" 最新在前，limit=1 只要一条）
+        # 不加 limit 会把整段聊天记录都下载下来，Thread 越长越浪费
+        messages = await client.beta.threads.messages.list(
+            thread_id=thread.id, limit=1, order="desc",
+        )
+
+        # 这一条就是助手的最新回复
+        assistant_reply = messages.data[0].content[0].text.value
+        print(f"助手：{assistant_reply}")
+    else:
+        print(f"❌ Run 未完成，状态：{run.status}")
+    print()
+
+    # ============================================================
+    # Step 6：继续对话（体现 Thread 的核心价值）
+    #
+    # 关键！！这里不需要带上之前的历史消息，
+    # Thread 已经记住了前面的对话内容，
+    # 助手会自动基于上下文回答。
+    #
+    # 对比普通 Chat API：你需要手动把所有历史 messages 拼起来带上
+    # Assistants API：只发新消息，历史自动保留
+    # ============================================================
+    print("=" * 55)
+    print("Step 6：继续追问（Thread 自动记住上下文）")
+    print("=" * 55)
+
+    user_message_2 = "好的！那「进程」和「线程」有什么区别呢？"
+    print(f"用户：{user_message_2}")
+    print()
+
+    # 直接加新消息，不需要带历史
+    await client.beta.threads.messages.create(
+        thread_id=thread.id,
+        role="user",
+        content=user_message_2,
+    )
+
+    # 再次 Run，助手知道上文说了"线程的比喻"，可以前后呼应
+    run2 = await client.beta.threads.runs.create(
+        thread_id=thread.id,
+        assistant_id=assistant_id,
+    )
+    run2 = await _poll_run(thread.id, run2.id)
+
+    if run2.status == "completed":
+        messages = await client.beta.threads.messages.list(
+            thread_id=thread.id, limit=1, order="desc",
+        )
+        assistant_reply_2 = messages.data[0].content[0].text.value
+        print(f"助手：{assistant_reply_2}")
+    print()
+
+    # ============================================================
+    # Step 7：清理资源（可选）
+    #
+    # Thread 和 Assistant 会持久保存在 OpenAI 云端，占用存储。
+    # Thread 是这次运行的临时会话，用完删掉；
+    # Assistant 的 ID 已经缓存在本地，保留下来供下次运行复用。
+    # 真实应用中，Thread 通常也会保留（用户下次可以继续聊）。
+    # ============================================================
+    print("=" * 55)
+    print("Step 7：清理资源")
+    print("=" * 55)
+
+    await client.beta.threads.delete(thread.id)
+    print(f"✅ Thread {thread.id} 已删除")
+
+    print(f"ℹ️  Assistant {assistant_id} 保留，下次运行直接复用")
+    print()
+
+
+asyncio.run(main())
 
 print("=" * 55)
 print("总结：Assistants API vs 普通 Chat API")